@@ -0,0 +1,70 @@
+# Vectorized activation equations, computed for a whole set of chunks in one NumPy pass
+import numpy as np
+
+
+def decay_sums(encounters, time, d):
+    """
+    Sum of the decayed encounters, sum_j (time - t_j) ** -d, of a set of chunks.
+    encounters holds one array of encounter times per chunk. Encounters at or after time do not count.
+    """
+    n = len(encounters)
+    if n == 0:
+        return np.empty(0)
+    counts = np.fromiter(map(len, encounters), dtype=np.intp, count=n)
+    ages = time - np.concatenate(encounters)
+    past = ages > 0
+    decayed = np.zeros(len(ages))
+    decayed[past] = ages[past] ** -d
+    # sum the decayed encounters per chunk
+    owners = np.repeat(np.arange(n), counts)
+    return np.bincount(owners, weights=decayed, minlength=n).astype(float)
+
+
+def base_levels(encounters, blcs, time, d):
+    """
+    Base-level activation ln(sum_j (time - t_j) ** -d) + blc of a set of chunks.
+    Chunks without any encounter before time get an activation of -inf.
+    """
+    with np.errstate(divide='ignore'):
+        return np.log(decay_sums(encounters, time, d)) + np.asarray(blcs, dtype=float)
+
+
+def approximate_base_levels(encounters, older_counts, first_encounters, blcs, time, d):
+    """
+    Base-level activation using the hybrid approximation of Petrov (2006).
+    encounters holds the most recent encounters of each chunk, which are summed exactly. The older_counts
+    encounters before those are assumed to be spread evenly between the first encounter and the oldest
+    recent one, which gives their contribution analytically. The approximation requires d < 1.
+    """
+    if d >= 1:
+        raise ValueError("Optimized learning requires a decay below 1, got %s" % d)
+    totals = decay_sums(encounters, time, d)
+    older = np.asarray(older_counts, dtype=float)
+    if older.any():
+        # age of the first encounter and of the oldest encounter that is still kept exactly
+        t_n = time - np.asarray(first_encounters, dtype=float)
+        t_k = np.array([time - e[0] if len(e) else 0.0 for e in encounters])
+        approximated = older > 0
+        t_n, t_k = t_n[approximated], t_k[approximated]
+        totals[approximated] += older[approximated] * (t_n ** (1 - d) - t_k ** (1 - d)) / ((1 - d) * (t_n - t_k))
+    with np.errstate(divide='ignore'):
+        return np.log(totals) + np.asarray(blcs, dtype=float)
+
+
+def similarities(values, value):
+    """
+    Similarity of each of the numeric slot values to value: minus the square root of their distance, divided by 5.
+    Values that are nan (no numeric value to compare to) have a similarity of nan.
+    """
+    return -np.sqrt(np.abs(values - float(value))) / 5
+
+
+def softmax(activations, s):
+    """
+    Boltzmann (softmax) weights exp(a_i / s) / sum_j exp(a_j / s) of a set of activations.
+    Uses the log-sum-exp trick, so large activations or a small s do not overflow.
+    """
+    scaled = np.asarray(activations, dtype=float) / s
+    scaled -= scaled.max()
+    weights = np.exp(scaled)
+    return weights / weights.sum()
@@ -1,6 +1,9 @@
 from chunkCog import Chunk
+from memory import DeclarativeMemory
+import activation
+import numpy as np
+from numbers import Number
 import math
-import random
 
 
 class ACTRModel(object):
@@ -12,6 +15,8 @@ class ACTRModel(object):
 
     d = 0.5  # decay (:bll; default: 0.5)
     s = 0.2  # scale of activation noise (:ans; default: 0)
+    ol = None  # optimized learning: number of recent encounters kept exactly, older ones are approximated
+    # (:ol; default: None = exact). Larger values give a smaller approximation error; requires d < 1
 
     lf = 0.1  # latency factor (:lf; default: 0.1)
     le = 1.0  # latency exponent (:le; default: 1.0)
@@ -20,21 +25,20 @@ class ACTRModel(object):
 
     mp = 3.0  # mismatch penalty (:mp)
 
-    def __init__(self):
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)  # source of all randomness of this model, seed it to replay a run
         self.time = 0
         self.goal = None
         self.imaginal = None
-        self.dm = []
+        self.dm = DeclarativeMemory()
+        self._spreading_key = None  # state of the buffers and DM the cached spreading sources belong to
+        self._spreading_sources = ({}, {})
 
     def get_chunk(self, name):
         """
         Find the Chunk given its name
         """
-        chunk_idx = [i for i, j in enumerate(self.dm) if j.name == name]
-        if len(chunk_idx) == 0:
-            return None
-        else:
-            return self.dm[chunk_idx[0]]
+        return self.dm.get(name)
 
     def add_encounter(self, chunk):
         """
@@ -42,36 +46,44 @@ class ACTRModel(object):
         If the chunk does not exist yet, create it first.
         """
 
-        update_fan = False
-
         # If a chunk by this name does not yet exist, add it to DM
-        if chunk.name not in [chunk.name for chunk in self.dm]:
-            self.dm.append(chunk)
-            update_fan = True
+        existing = self.dm.get(chunk.name)
+        update_fan = existing is None
+        if update_fan:
+            self.dm.add(chunk)
 
         # If a chunk by this name does exist, ensure that it has the same slots and slot values
-        chunk_idx = [i for i, j in enumerate(self.dm) if j.name == chunk.name][0]
-        if self.dm[chunk_idx].slots != chunk.slots:
+        elif existing.slots != chunk.slots:
             raise ValueError(
                 "Trying to add an encounter to a chunk with the same name (%s) but different slots and/or slot values" % chunk.name)
 
         # Add an encounter at the current time
-        self.dm[chunk_idx].add_encounter(self.time)
+        self.dm.get_writable(chunk.name).add_encounter(self.time, keep=self.check_ol())
 
-        slot_vals = chunk.slots.values()
+        # Only string slot values can refer to other chunks
+        refs = list(dict.fromkeys(v for v in chunk.slots.values() if type(v) == str))
 
         # Add slot values as singleton chunks
-        for v in slot_vals:
-            if type(v) == str and v not in [ch.name for ch in
-                                            self.dm]:  # NT: we want some contraints on the adding of chunks
+        for v in refs:
+            if self.dm.get(v) is None:  # NT: we want some contraints on the adding of chunks
                 s = Chunk(name=v, slots={})
                 self.add_encounter(s)
 
         # Increment the fan of all chunks that this chunk references in its slots
         if update_fan:
-            refs = [i for i, ref in enumerate(self.dm) if ref.name in slot_vals]
             for ref in refs:
-                self.dm[ref].fan += 1
+                self.dm.increment_fan(ref)
+
+    def check_ol(self):
+        """
+        Return the optimized learning parameter, after checking that it can be used with the decay
+        """
+        if self.ol is not None:
+            if self.ol < 0:
+                raise ValueError("Optimized learning cannot keep a negative number of encounters, got %s" % self.ol)
+            if self.d >= 1:
+                raise ValueError("Optimized learning requires a decay below 1, got %s" % self.d)
+        return self.ol
 
     def get_activation_no_noise(self, chunk):
         """
@@ -81,17 +93,35 @@ class ACTRModel(object):
         if chunk not in self.dm:
             raise ValueError("The specified chunk (%s) does not exist in DM" % str(chunk.name))
 
-        # There should be at least one past encounter of the chunk
-        if self.time <= min(chunk.encounters):
-            raise ValueError("Chunk %s not encountered at or before time %s" % (str(chunk.name), str(self.time)))
+        return float(self.get_activations_no_noise([chunk])[0])
+
+    def get_activations_no_noise(self, chunks):
+        """
+        Get the activations of the specified chunks at the current time, without noise, as an array
+        """
+        encounters = [ch.encounters for ch in chunks]
+        blcs = [ch.blc for ch in chunks]
+        older_counts = [ch.encounter_count - len(ch.encounters) for ch in chunks]
+        if any(older_counts):
+            firsts = [ch.first_encounter for ch in chunks]
+            baselevel_activations = activation.approximate_base_levels(encounters, older_counts, firsts, blcs,
+                                                                       self.time, self.d)
+        else:
+            baselevel_activations = activation.base_levels(encounters, blcs, self.time, self.d)
 
-        baselevel_activation = math.log(sum([(self.time - encounter) ** -self.d for encounter in chunk.encounters if
-                                             encounter < self.time])) + chunk.blc
+        # There should be at least one past encounter of each chunk
+        if np.isneginf(baselevel_activations).any():
+            chunk = chunks[int(np.argmax(np.isneginf(baselevel_activations)))]
+            raise ValueError("Chunk %s not encountered at or before time %s" % (str(chunk.name), str(self.time)))
 
-        spreading_activation = self.get_spreading_activation_from_goal(
-            chunk) + self.get_spreading_activation_from_imaginal(chunk)
+        goal_sources, imaginal_sources = self.get_spreading_sources()
+        if goal_sources or imaginal_sources:
+            spreading_activations = np.fromiter((self._spread(goal_sources, ch) + self._spread(imaginal_sources, ch)
+                                                 for ch in chunks), dtype=float, count=len(chunks))
+        else:
+            spreading_activations = np.zeros(len(chunks))
 
-        return baselevel_activation + spreading_activation
+        return baselevel_activations + spreading_activations
 
     def get_activation(self, chunk):
         """
@@ -99,6 +129,12 @@ class ACTRModel(object):
         """
         return self.get_activation_no_noise(chunk) + self.noise(self.s)
 
+    def get_activations(self, chunks):
+        """
+        Get the activations of the specified chunks at the current time, each with its own noise
+        """
+        return self.get_activations_no_noise(chunks) + self.noise(self.s, len(chunks))
+
     def get_latency(self, chunk):
         """
         Get the retrieval latency of the specified chunk at the current time.
@@ -106,56 +142,75 @@ class ACTRModel(object):
         activation = self.get_activation(chunk)
         return self.lf * math.exp(-self.le * activation)
 
-    def noise(self, s):
+    def noise(self, s, size=None):
         """
         Generate activation noise by drawing a value from a logistic distribution with mean 0 and scale s.
+        If size is given, draw an array of that many values at once.
         """
-        rand = random.uniform(0.001, 0.999)
-        return s * math.log((1 - rand) / rand)
+        rand = self.rng.uniform(0.001, 0.999, size)
+        if size is None:
+            return s * math.log((1 - rand) / rand)
+        return s * np.log((1 - rand) / rand)
 
-    def get_spreading_activation_from_goal(self, chunk):
+    def get_spreading_sources(self):
         """
-        Calculate the amount of spreading activation from the goal buffer to the specified chunk.
+        Get the weights of the sources of spreading activation in the goal and imaginal buffers, as a pair of
+        {value: weight} dicts. The weights are cached, and only recomputed when the contents of a buffer or the
+        chunks in DM change.
         """
+        key = (self._buffer_state(self.goal), self._buffer_state(self.imaginal), self.dm.version)
+        if key != self._spreading_key:
+            self._spreading_sources = (self._get_source_weights(self.goal, self.ga),
+                                       self._get_source_weights(self.imaginal, self.ia))
+            self._spreading_key = key
+        return self._spreading_sources
+
+    @staticmethod
+    def _buffer_state(buffer):
+        """
+        Snapshot of a buffer that changes whenever the chunk in it or one of its slot values changes
+        """
+        if buffer is None:
+            return None
+        return id(buffer), tuple(buffer.slots.items())
 
-        if self.goal is None:
-            return 0
-
-        if type(self.goal) is Chunk:
-            spreading = 0.0
-            total_slots = 0
-            for value in self.goal.slots.values():
-                total_slots += 1
-                ch1 = self.get_chunk(value)
-                if ch1 != None and value in chunk.slots.values() and ch1.fan > 0:
-                    spreading += max(0, self.mas - math.log(ch1.fan))
-
-        if total_slots == 0:
+    def _get_source_weights(self, buffer, weight):
+        """
+        Calculate how much spreading activation each slot value in the buffer sends to the chunks that contain it.
+        """
+        sources = {}
+        if type(buffer) is not Chunk or len(buffer.slots) == 0:
+            return sources
+
+        total_slots = len(buffer.slots)
+        for value in buffer.slots.values():
+            ch1 = self.get_chunk(value)
+            if ch1 != None and ch1.fan > 0:
+                spreading = max(0, self.mas - math.log(ch1.fan)) * (weight / total_slots)
+                sources[value] = sources.get(value, 0.0) + spreading
+        return sources
+
+    @staticmethod
+    def _spread(sources, chunk):
+        """
+        Sum the weights of the sources that occur in the slots of the specified chunk.
+        """
+        if not sources:
             return 0
+        values = chunk.slots.values()
+        return sum(spreading for value, spreading in sources.items() if value in values)
 
-        return spreading * (self.ga / total_slots)
+    def get_spreading_activation_from_goal(self, chunk):
+        """
+        Calculate the amount of spreading activation from the goal buffer to the specified chunk.
+        """
+        return self._spread(self.get_spreading_sources()[0], chunk)
 
     def get_spreading_activation_from_imaginal(self, chunk):
         """
         Calculate the amount of spreading activation from the imaginal buffer to the specified chunk.
         """
-
-        if self.imaginal is None:
-            return 0
-
-        if type(self.imaginal) is Chunk:
-            spreading = 0.0
-            total_slots = 0
-            for value in self.imaginal.slots.values():
-                total_slots += 1
-                ch1 = self.get_chunk(value)
-                if ch1 != None and value in chunk.slots.values() and ch1.fan > 0:
-                    spreading += max(0, self.mas - math.log(ch1.fan))
-
-        if total_slots == 0:
-            return 0
-
-        return spreading * (self.ia / total_slots)
+        return self._spread(self.get_spreading_sources()[1], chunk)
 
     def match(self, chunk1, pattern):
         """
@@ -173,11 +228,14 @@ class ACTRModel(object):
         """
         bestMatch = None
         bestActivation = self.rt
-        for ch in self.dm:
-            act = self.get_activation(ch)
-            if self.match(ch, chunk) and act > bestActivation:
-                bestMatch = ch
-                bestActivation = act
+        # Only matching chunks compete, so only their activation is needed
+        candidates = self.dm.find(chunk.slots)
+        if candidates:
+            activations = self.get_activations(candidates)
+            best = int(np.argmax(activations))
+            if activations[best] > self.rt:
+                bestMatch = candidates[best]
+                bestActivation = float(activations[best])
         if bestMatch == None:
             latency = self.lf * math.exp(-self.le * self.rt)
         else:
@@ -216,15 +274,30 @@ class ACTRModel(object):
         """
         bestMatch = None
         bestActivation = self.rt
-        for ch in self.dm:
-            act = self.get_activation(ch)
-            penalty = self.partial_match(ch, chunk)
-
-            if penalty != None and act + penalty > bestActivation:
-                bestMatch = ch
-                bestActivation = act + penalty
-            if trace == True and penalty != None:
-                print("Chunk %s has activation %f and penalty %f" % (ch.name, act, penalty))
+
+        # Slot values other than numbers never partially match, so they narrow down the candidates through the index
+        exact_slots = dict((slot, value) for slot, value in chunk.slots.items() if not isinstance(value, Number))
+        candidates = self.dm.find(exact_slots)
+
+        # Penalise numeric slot values of all candidates at once; candidates without numeric values there get nan
+        penalties = np.zeros(len(candidates))
+        for slot, value in chunk.slots.items():
+            if slot not in exact_slots:
+                penalties += activation.similarities(self.dm.column(candidates, slot), value) * self.mp
+        matching = ~np.isnan(penalties)
+        candidates = [ch for ch, match in zip(candidates, matching) if match]
+        penalties = penalties[matching]
+
+        if candidates:
+            activations = self.get_activations(candidates)
+            if trace == True:
+                for ch, act, penalty in zip(candidates, activations, penalties):
+                    print("Chunk %s has activation %f and penalty %f" % (ch.name, act, penalty))
+            activations += penalties
+            best = int(np.argmax(activations))
+            if activations[best] > self.rt:
+                bestMatch = candidates[best]
+                bestActivation = float(activations[best])
         if bestMatch == None:
             latency = self.lf * math.exp(-self.le * self.rt)
         else:
@@ -236,25 +309,54 @@ class ACTRModel(object):
         Returns the probability of retrieving a specific chunk that matches the specified pattern,
         given its activation and the activation of the other matching chunks
         """
-        activations = dict([(ch, self.get_activation_no_noise(ch)) for ch in self.dm if self.match(ch, pattern)])
-        return math.exp(activations[chunk] / self.s) / sum([math.exp(a / self.s) for a in activations.values()])
+        for ch, _, probability, _ in self.get_retrieval_distribution(pattern):
+            if ch is chunk:
+                return probability
+        raise KeyError(chunk)
+
+    def get_retrieval_distribution(self, pattern):
+        """
+        Returns the distribution of retrievals over all chunks that match the specified pattern, as a list of
+        (chunk, activation, probability, latency) tuples based on the activations without noise
+        """
+        matching = self.dm.find(pattern.slots)
+        if not matching:
+            return []
+        activations = self.get_activations_no_noise(matching)
+        probabilities = activation.softmax(activations, self.s)
+        latencies = self.lf * np.exp(-self.le * activations)
+        return list(zip(matching, activations.tolist(), probabilities.tolist(), latencies.tolist()))
 
     def retrieve_blended_trace(self, pattern, slot):
         """
         Returns a blend of the requested slot value from all chunks in DM that match the specified pattern, weighted by their activation
         """
+        blended_values, latency, _ = self.retrieve_blended(pattern, [slot])
+        if blended_values is None:
+            return None, latency
+        return blended_values[slot], latency
+
+    def retrieve_blended(self, pattern, slots):
+        """
+        Blend each of the requested slots over all chunks in DM that match the specified pattern and have a value
+        in all of these slots, weighted by the softmax of their activations.
+        Returns a dict with the blended value per slot (or None), the latency, and a dict with the weight per chunk
+        """
 
         latency = self.lf * math.exp(-self.le * self.rt)  # Latency is determined by the retrieval threshold
 
-        eligible_chunks = [ch for ch in self.dm if self.match(ch, pattern) and slot in ch.slots and ch.slots[slot]]
+        eligible_chunks = [ch for ch in self.dm.find(pattern.slots) if
+                           all(slot in ch.slots and ch.slots[slot] for slot in slots)]
 
         if not eligible_chunks:
-            return None, latency
+            return None, latency, {}
 
-        chunk_probs = dict([(ch, math.exp(self.get_activation_no_noise(ch) / self.s)) for ch in eligible_chunks])
-        blended_value = sum([ch.slots[slot] * prob / sum(chunk_probs.values()) for ch, prob in chunk_probs.items()])
+        weights = activation.softmax(self.get_activations_no_noise(eligible_chunks), self.s)
+        blended_values = dict((slot, float(np.dot(weights, np.fromiter((ch.slots[slot] for ch in eligible_chunks),
+                                                                        dtype=float, count=len(eligible_chunks)))))
+                              for slot in slots)
 
-        return blended_value, latency
+        return blended_values, latency, dict(zip(eligible_chunks, weights))
 
     def __str__(self):
         return "\n=== Model ===\n" \
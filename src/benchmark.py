@@ -0,0 +1,208 @@
+# Micro-benchmarks of the model's hot paths, with declarative memory filled with more and more wait-fact encounters,
+# to catch code that slows down as the learned memory grows
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time as tm
+import timeit
+import numpy as np
+import temporal
+from chunkCog import Chunk
+from cogmodel import CognitiveModel, wait_fact_query
+
+dm_sizes = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5)
+
+
+class BenchmarkModel(CognitiveModel):
+    """
+    Cognitive model with the gap facts and a given number of synthetic wait-fact encounters in memory,
+    instead of the memory built from the data files
+    """
+    blocking_timing = False
+    memory_writer = staticmethod(lambda rows: None)
+
+    def __init__(self, encounters, seed=0):
+        self.encounters = encounters
+        super().__init__(seed, shared_memory=False)
+
+    def _init_memory(self):
+        self._add_gap_facts()
+        # wait times grow with the gap, like those of a human player
+        gaps = self.rng.integers(1, 100, size=self.encounters)
+        expected = np.array([temporal.time_to_pulses(0.5 + 0.25 * gap, add_noise=False) for gap in range(100)])
+        pulses = np.maximum(1, np.rint(self.rng.normal(expected[gaps], 2)).astype(int))
+        for gap, pulse_count in zip(gaps.tolist(), pulses.tolist()):
+            self.time += 0.05
+            self.add_wait_fact(gap, pulse_count)
+        self.time += 1
+
+
+# each benchmark sets up what it needs on the model and returns the call to time
+def bench_retrieve(model):
+    query = wait_fact_query(50)
+    return lambda: model.retrieve(query)
+
+
+def bench_retrieve_partial(model):
+    query = wait_fact_query(50)
+    return lambda: model.retrieve_partial(query)
+
+
+def bench_retrieve_blended_trace(model):
+    query = wait_fact_query(50)
+    return lambda: model.retrieve_blended_trace(query, "wait")
+
+
+def bench_add_encounter(model):
+    chunk = Chunk(name="g50-w40", slots={"type": "wait-fact", "gap": 50, "wait": 40}, blc=5)
+
+    def add_encounter():
+        model.time += 0.05
+        model.add_encounter(chunk)
+
+    return add_encounter
+
+
+def bench_determine_gap(model):
+    def determine_gap():
+        model.reset_imaginal()
+        model.determine_gap(73, 28)
+
+    return determine_gap
+
+
+def bench_get_wait_time(model):
+    return lambda: model.get_wait_time(50)
+
+
+def bench_time_to_pulses(model):
+    return lambda: temporal.time_to_pulses(10.0, rng=model.rng)
+
+
+def bench_pulses_to_time(model):
+    return lambda: temporal.pulses_to_time(40, rng=model.rng)
+
+
+# benchmarks of which the speed depends on the size of declarative memory
+dm_benchmarks = {
+    'retrieve': bench_retrieve,
+    'retrieve_partial': bench_retrieve_partial,
+    'retrieve_blended_trace': bench_retrieve_blended_trace,
+    'add_encounter': bench_add_encounter,
+    'determine_gap': bench_determine_gap,
+    'get_wait_time': bench_get_wait_time,
+}
+
+# benchmarks that do not use declarative memory
+memoryless_benchmarks = {
+    'time_to_pulses': bench_time_to_pulses,
+    'pulses_to_time': bench_pulses_to_time,
+}
+
+
+# time a call, returning the seconds per call of each of repeat rounds
+def measure(call, repeat=5, min_time=0.2):
+    timer = timeit.Timer(call)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return [t / number for t in timer.repeat(repeat=repeat, number=number)], number
+
+
+def result(name, dm_size, times, number, chunks=None):
+    return {
+        'benchmark': name,
+        'dm_encounters': dm_size,
+        'dm_chunks': chunks,
+        'calls_per_round': number,
+        'min_us': min(times) * 1e6,
+        'median_us': statistics.median(times) * 1e6,
+        'max_us': max(times) * 1e6,
+    }
+
+
+def run(sizes=dm_sizes, only=None, repeat=5, min_time=0.2, seed=0):
+    results = []
+    # tables built once per process are not part of any benchmark
+    temporal.lookup_tables()
+    for size in sizes:
+        build_start = tm.perf_counter()
+        model = BenchmarkModel(size, seed)
+        results.append(result('build_memory', size, [tm.perf_counter() - build_start], 1, len(model.dm)))
+        for name, benchmark in dm_benchmarks.items():
+            if only and name not in only:
+                continue
+            # a fresh model for each benchmark, so they do not see each other's encounters
+            model = BenchmarkModel(size, seed)
+            times, number = measure(benchmark(model), repeat, min_time)
+            results.append(result(name, size, times, number, len(model.dm)))
+    model = BenchmarkModel(0, seed)
+    for name, benchmark in memoryless_benchmarks.items():
+        if only and name not in only:
+            continue
+        times, number = measure(benchmark(model), repeat, min_time)
+        results.append(result(name, None, times, number))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# compare the median times of two runs, returning the benchmarks that got more than threshold times slower
+def compare(baseline, results, threshold=1.25):
+    key = lambda r: (r['benchmark'], r['dm_encounters'])
+    old = {key(r): r for r in baseline['results']}
+    regressions = []
+    for r in results['results']:
+        if key(r) not in old or r['benchmark'] == 'build_memory':
+            continue
+        ratio = r['median_us'] / old[key(r)]['median_us']
+        print(f"{r['benchmark']:>24} {str(r['dm_encounters']):>7} {old[key(r)]['median_us']:12.2f} us "
+              f"-> {r['median_us']:12.2f} us  x{ratio:.2f}")
+        if ratio > threshold:
+            regressions.append((key(r), ratio))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the model for growing memory sizes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=dm_sizes,
+                        help="numbers of wait-fact encounters in memory")
+    parser.add_argument('--only', nargs='+', help="names of the benchmarks to run")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds each round of calls should take")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="results of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="slowdown relative to the earlier run that counts as a regression")
+    args = parser.parse_args()
+
+    run_results = run(args.sizes, args.only, args.repeat, args.min_time, args.seed)
+    for r in run_results:
+        print(f"{r['benchmark']:>24} {str(r['dm_encounters']):>7} {r['median_us']:12.2f} us")
+    output = {
+        'created': tm.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'results': run_results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print("Results written to", args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), output, args.threshold)
+        if regressions:
+            print("Slower than before:", ", ".join(f"{name} ({size})" for (name, size), _ in regressions))
+            sys.exit(1)
@@ -1,22 +1,80 @@
+from array import array
+from bisect import bisect_left
+from sys import intern
+from types import MappingProxyType
+
+
+def _intern_slots(slots):
+    """
+    Copy slots with interned slot names and string values, so chunks share one copy of e.g. "type" and "wait-fact"
+    """
+    return dict((intern(slot), intern(value) if type(value) == str else value) for slot, value in slots.items())
+
+
 class Chunk(object):
+    __slots__ = ('name', 'slots', 'encounters', 'encounter_count', 'first_encounter', 'fan', 'blc')
 
     def __init__(self, name, slots, blc=0):
         self.name = name
-        self.slots = slots
-        self.encounters = []
+        self.slots = _intern_slots(slots)
+        self.encounters = array('d')  # encounter times, sorted and stored contiguously
+        self.encounter_count = 0  # number of encounters, including those no longer kept in encounters
+        self.first_encounter = None  # time of the first encounter
         self.fan = 0  # How many other chunks refer to this chunk?
         self.blc = blc  # the base-level activation constant
 
-    def add_encounter(self, time):
+    def add_encounter(self, time, keep=None):
         """
         Add an encounter of this chunk at the specified time.
+        If keep is given, only the keep most recent encounter times are kept; older ones are only counted.
+        """
+        encounters = self.encounters
+        if not encounters or time > encounters[-1]:
+            encounters.append(time)
+        else:
+            i = bisect_left(encounters, time)
+            if encounters[i] == time:
+                return
+            encounters.insert(i, time)
+        self.encounter_count += 1
+        if self.first_encounter is None or time < self.first_encounter:
+            self.first_encounter = time
+        if keep is not None and len(encounters) > keep:
+            del encounters[:len(encounters) - keep]
+
+    def copy(self):
+        """
+        Return an independent copy of this chunk, including its encounters and fan.
         """
-        if time not in self.encounters:
-            self.encounters.append(time)
+        chunk = Chunk(self.name, self.slots, self.blc)
+        chunk.encounters = array('d', self.encounters)
+        chunk.encounter_count = self.encounter_count
+        chunk.first_encounter = self.first_encounter
+        chunk.fan = self.fan
+        return chunk
 
     def __str__(self):
         return "Chunk " + str(self.name) + "\n" \
                                            "Slots: " + str(self.slots) + "\n" \
-                                                                         "Encounters: " + str(self.encounters) + "\n" \
+                                                                         "Encounters: " + str(list(self.encounters)) + "\n" \
                                                                                                                  "Fan: " + str(
             self.fan) + "\n"
+
+
+class Query(object):
+    """
+    A retrieval request: the slot values that chunks in DM should match.
+    Unlike a Chunk it has no encounters and cannot be changed, so the same Query can be reused for every request.
+    """
+    __slots__ = ('name', 'slots')
+
+    def __init__(self, slots, name="query"):
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'slots', MappingProxyType(_intern_slots(slots)))
+
+    def __setattr__(self, key, value):
+        raise AttributeError("A Query cannot be changed")
+
+    def __str__(self):
+        return "Query " + str(self.name) + "\n" \
+                                           "Slots: " + str(dict(self.slots)) + "\n"
@@ -1,25 +1,100 @@
 from actrmodel import ACTRModel
-from chunkCog import Chunk
+from chunkCog import Chunk, Query
+from memory import DeclarativeMemory
+from persistence import legacy_path, load_learned_facts, store_path, write_learned_memory
+import snapshot
+from functools import lru_cache
 import temporal
+import logging
 import time as tm
-import pandas as pd
-import numpy as np
-from os import path
+import csv
+
+log = logging.getLogger('mind.memory')  # loading and saving learned memories
+narration = logging.getLogger('mind.cognition')  # what the model thinks and decides
+
+init_memory_path = '../data/init_memory.csv'
+snapshot_path = '../data/dm_snapshot.npz'
+
+
+# Retrieval requests cannot change, so each one is created once and reused
+@lru_cache(maxsize=256)
+def wait_fact_query(gap):
+    return Query({"type": "wait-fact", "gap": gap}, name="wait-fact-query")
+
+
+@lru_cache(maxsize=256)
+def gap_fact_query(num1, num2):
+    return Query({"type": "gap-fact", "num1": num1, "num2": num2}, name="gap-fact-query")
 
 
 # The cognitive part of the game's model
 
 class CognitiveModel(ACTRModel):
-    def __init__(self):
-        super().__init__()
+    # sleep for the duration of each cognitive step, only meant for running the model outside of an event loop.
+    # Otherwise cognitive steps only advance the model clock, and the model's timers wait for them instead
+    blocking_timing = False
+
+    # declarative memory built from the data files, shared by all models in this process
+    _base_memory = None
+    _base_key = None  # source key of the data files the shared memory was built from
+    _base_checked = 0  # monotonic time at which the data files were last checked for changes
+    # seconds between checks whether the data files changed, e.g. because another session saved what it learned
+    source_check_interval = 5.0
+
+    # saves new learned memories right away. The server replaces it with a write-behind writer,
+    # and processes that do not own the data files with one that passes the memories on
+    memory_writer = staticmethod(write_learned_memory)
+
+    # version of how memory is built from the data files: bump it when that changes, so old snapshots are rebuilt
+    memory_version = 1
+
+    def __init__(self, seed=None, shared_memory=True):
+        super().__init__(seed)
         self.rt = -2.0
+        self.busy_until = 0  # real time at which the model is done with the cognitive steps taken so far
         # initialise memory
-        self._init_memory()
-        self.learned_memory = []
-        self.mem_index = 0
+        if shared_memory:
+            self._use_shared_memory()
+        else:
+            self._init_memory()
+        self.learned_memory = []  # (gap, pulses, time) of the wait facts learned since they were last saved
+
+    # Build declarative memory from the data files once, and only keep this model's own changes on top of it.
+    # The shared memory is built again when the data files changed, so new models know what earlier sessions
+    # learned. Models that are already running keep the memory they started with.
+    def _use_shared_memory(self):
+        now = tm.monotonic()
+        if CognitiveModel._base_memory is None or now - CognitiveModel._base_checked >= self.source_check_interval:
+            CognitiveModel._base_checked = now
+            key = self.source_key()
+            if key != CognitiveModel._base_key:
+                base = CognitiveModel(shared_memory=False)
+                base.dm.freeze()
+                CognitiveModel._base_memory = base.dm
+                CognitiveModel._base_key = key
+                # build the pacemaker tables along with the memory, rather than during the first game event
+                temporal.lookup_tables()
+        self.dm = DeclarativeMemory(base=CognitiveModel._base_memory)
+
+    # key of the data files memory is built from, which changes whenever one of them does
+    def source_key(self):
+        return snapshot.source_key([init_memory_path, store_path, legacy_path], self.memory_version, self.ol)
 
-    # Initialise declarative memory with gap facts and pulse durations
+    # Initialise declarative memory with gap facts and pulse durations, from the snapshot of the data files if it
+    # is up to date, otherwise build it and save a new snapshot
     def _init_memory(self):
+        key = self.source_key()
+        dm = snapshot.load(snapshot_path, key)
+        if dm is not None:
+            self.dm = dm
+            return
+        self._build_memory()
+        try:
+            snapshot.save(self.dm, snapshot_path, key)
+        except OSError:
+            log.exception("Failed to save snapshot %s", snapshot_path)
+
+    def _build_memory(self):
         self._add_gap_facts()
         self._add_wait_facts()
         # add variable include_learned=False if you don't want learned memories
@@ -29,23 +104,20 @@ class CognitiveModel(ACTRModel):
     # add gap, pulses from the init_memory file
     def _add_wait_facts(self):
         # Get initial times to wait from timing_data csv
-        data = pd.read_csv('../data/init_memory.csv', usecols=['Gap', 'Pulses'])
-        array = data.to_numpy()  # data is type numpy.int64 (compatible with int)
-        for gap, time in array:
-            self.add_wait_fact(gap, time)
+        with open(init_memory_path, newline='') as f:
+            for row in csv.DictReader(f):
+                self.add_wait_fact(int(row['Gap']), int(row['Pulses']))
 
-    # add gap, pulses from learned_memory file
+    # add the learned wait facts, each once however often it was learned
     def load_learned_memory(self, include_learned=True):
-        if not path.isfile('../data/learned_memory.csv'):
+        facts = load_learned_facts()
+        if not facts:
             return
-        data = pd.read_csv('../data/learned_memory.csv', usecols=['Gap', 'Pulses'])
-        array = data.to_numpy()
-        self.learned_memory = [(gap, pulses) for [gap, pulses] in array]
-        self.mem_index = len(self.learned_memory)
         if include_learned:
-            for gap, time in array:
-                self.add_wait_fact(gap, time)
-        print("loaded learned memory")
+            # learned facts were always read as floats, so their chunks are named like g25.0-w44.0
+            for gap, pulses in facts:
+                self.add_wait_fact(float(gap), float(pulses))
+        log.info("loaded %s learned facts", len(facts))
 
     # Generate chunks for the gap facts and add them to memory
     def _add_gap_facts(self):
@@ -64,31 +136,34 @@ class CognitiveModel(ACTRModel):
                                                       "gap": gap, "wait": time}, blc=5)
             # add new fact to memory (or add encounter to already existing memory)
             self.add_encounter(wait_fact)
-            if add_to_csv and (gap, time) not in self.learned_memory:
-                self.learned_memory.append((gap, time))
+            if add_to_csv:
+                self.learned_memory.append((gap, time, self.now()))
 
-    # append the learned_memory csv
+    # save the wait facts learned since the last time
     def append_learned_memory(self):
-        if len(self.learned_memory) <= self.mem_index:
-            print("No new memories to add.")
+        if not self.learned_memory:
+            log.debug("No new memories to add.")
             return
-        print("Adding new memories to the learned memories data file.")
-        # only add the memories that weren't in csv yet
-        for i, new_memory in enumerate(self.learned_memory, self.mem_index):
-            gap, pulses = new_memory
-            seconds = temporal.pulses_to_time(pulses)
-            # initialise new row for csv
-            row = [gap, round(seconds, 3), int(pulses)]
-            # Create DataFrame of new row
-            df = pd.DataFrame(row).transpose()
-            df.columns = ['Gap', 'Time (s)', "Pulses"]
-            # add new df to csv
-            with open('../data/learned_memory.csv', 'a') as f:
-                df.to_csv(f, mode='a', header=f.tell() == 0, index=False)
-        added = len(self.learned_memory) - self.mem_index
-        print(f"I added {added} new memories.")
-        # update the memory index so that the newly-added memories will only be added once
-        self.mem_index = len(self.learned_memory)
+        rows = [[gap, int(pulses), seen] for gap, pulses, seen in self.learned_memory]
+        self.memory_writer(rows)
+        log.info("I added %s new memories.", len(rows))
+        self.learned_memory = []
+
+    # current real time in seconds
+    def now(self):
+        return tm.time()
+
+    # let the time of a cognitive step (production, buffer change or retrieval) pass
+    def pass_time(self, seconds):
+        self.time += seconds
+        if self.blocking_timing:
+            tm.sleep(seconds)
+        else:
+            self.busy_until = max(self.busy_until, self.now()) + seconds
+
+    # real time left before the model is done with the cognitive steps it has taken
+    def remaining_latency(self):
+        return max(0, self.busy_until - self.now())
 
     # generates time for the model to perform a movement + randomness
     # t can be generated with Fitt's Law but is set as 0.1 as minimum-time, n = 3 by default
@@ -96,7 +171,7 @@ class CognitiveModel(ACTRModel):
         low = t * ((n - 1) / n)
         high = t * ((n + 1) / n)
         # time the actual movement takes
-        mt = np.random.uniform(low, high)
+        mt = self.rng.uniform(low, high)
         # time for initiation, preparation, and execution of movement
         mt += 0.15
         self.time += mt
@@ -104,23 +179,18 @@ class CognitiveModel(ACTRModel):
 
     # model retrieves how long it has to wait with a given gap
     def get_wait_time(self, gap):
-        blend_pattern = Chunk(name="blend-pattern", slots={"type": "wait-fact", "gap": gap})
-        tm.sleep(0.05)
-        wait_time, latency = self.retrieve_blended_trace(blend_pattern, "wait")
-        tm.sleep(latency)
+        pattern = wait_fact_query(gap)
+        wait_time, latency = self.retrieve_blended_trace(pattern, "wait")
         # add time for retrieval request
-        self.time += 0.05 + latency
+        self.pass_time(0.05 + latency)
         # if model has seen this gap before, return wait time
         if wait_time is not None:
             return wait_time
         # if model has not seen this gap before, return wait time of most similar gap
         else:
-            partial_pattern = Chunk(name="partial-pattern", slots={"type": "wait-fact", "gap": gap})
-            tm.sleep(0.05)
-            wait_fact, latency = self.retrieve_partial(partial_pattern)
-            tm.sleep(latency)
+            wait_fact, latency = self.retrieve_partial(pattern)
             # add time for second retrieval request
-            self.time += 0.05 + latency
+            self.pass_time(0.05 + latency)
             wait_time = wait_fact.slots["wait"]
             if wait_time is None:
                 raise LookupError("I couldn't figure out how long to wait.")
@@ -146,63 +216,52 @@ class CognitiveModel(ACTRModel):
             calc_gap = Chunk(name="calc-gap",
                              slots={"ones1": ones_hand, "ones2": ones_pile, "tens1": tens_hand, "tens2": tens_pile,
                                     "gap-tens": None, "gap-ones": None, "gap-tot": None})
-            tm.sleep(0.2)
             self.imaginal = calc_gap
             # imaginal request takes 200 ms
-            self.time += 0.2
+            self.pass_time(0.2)
             self.determine_gap(hand, pile)
 
         if self.imaginal.slots["gap-tens"] is None and (hand >= 10 or pile >= 10):
             # time for production firing
-            tm.sleep(0.05)
-            self.time += 0.05
+            self.pass_time(0.05)
             tens_hand = self.imaginal.slots["tens1"]
             tens_pile = self.imaginal.slots["tens2"]
             # get gap fact for tens
-            pattern = Chunk(name="retrieve", slots={"type": "gap-fact", "num1": tens_hand, "num2": tens_pile})
-            tm.sleep(0.05)
+            pattern = gap_fact_query(tens_hand, tens_pile)
             chunk, latency = self.retrieve(pattern)
-            tm.sleep(latency)
             # add time for retrieval request and time it takes to get chunk
-            self.time += 0.05 + latency
-            tm.sleep(0.2)
+            self.pass_time(0.05 + latency)
             self.imaginal.slots["gap-tens"] = chunk.slots["gap"]
             # modifying imaginal buffer takes time
-            self.time += 0.2
+            self.pass_time(0.2)
             self.determine_gap(hand, pile)
 
         if self.imaginal.slots["gap-ones"] is None:
             # time for production firing
-            tm.sleep(0.05)
-            self.time += 0.05
+            self.pass_time(0.05)
             ones_hand = self.imaginal.slots["ones1"]
             ones_pile = self.imaginal.slots["ones2"]
-            pattern = Chunk(name="retrieve", slots={"type": "gap-fact", "num1": ones_hand, "num2": ones_pile})
-            tm.sleep(0.05)
+            pattern = gap_fact_query(ones_hand, ones_pile)
             chunk, latency = self.retrieve(pattern)
-            tm.sleep(latency)
             # add time for retrieval request and time it takes to get chunk
-            self.time += 0.05 + latency
-            tm.sleep(0.2)
+            self.pass_time(0.05 + latency)
             self.imaginal.slots["gap-ones"] = chunk.slots["gap"]
             # modifying imaginal buffer takes time
-            self.time += 0.2
+            self.pass_time(0.2)
             self.determine_gap(hand, pile)
 
         if self.imaginal.slots["gap-tot"] is None:
             # time for production firing
-            tm.sleep(0.05)
-            self.time += 0.05
+            self.pass_time(0.05)
             if self.imaginal.slots["gap-tens"] is not None:
                 gap_tens = self.imaginal.slots["gap-tens"]
             else:
                 gap_tens = 0
             gap_ones = self.imaginal.slots["gap-ones"]
             gap_tot = gap_tens * 10 + gap_ones
-            tm.sleep(0.2)
             self.imaginal.slots["gap_tot"] = gap_tot
             # modifying imaginal buffer takes time
-            self.time += 0.2
+            self.pass_time(0.2)
             return gap_tot
 
         return None
@@ -211,24 +270,21 @@ class CognitiveModel(ACTRModel):
     def _add_goal(self):
         goal_0 = Chunk(name="goal", slots={"type": "game-state", "hand": None, "pile": 0,
                                            "gap": None, "wait": None, "success": None})
-        tm.sleep(0.05)
         self.goal = goal_0
         # setting a goal takes 50 ms
-        self.time += 0.05
+        self.pass_time(0.05)
 
     # process change in pile in goal buffer
     def set_pile(self, top_card):
         self.check_goal()
-        tm.sleep(0.05)
         self.goal.slots["pile"] = top_card
-        self.time += 0.05
+        self.pass_time(0.05)
 
     # process change in hand in goal buffer
     def set_hand(self, lowest_card):
         self.check_goal()
-        tm.sleep(0.05)
         self.goal.slots["hand"] = lowest_card
-        self.time += 0.05
+        self.pass_time(0.05)
 
     # check goal is not None
     def check_goal(self):
@@ -237,10 +293,9 @@ class CognitiveModel(ACTRModel):
 
     # reset goal entirely or partially
     def reset_goal(self, partial=False):
-        print("model goal reset")
+        narration.debug("model goal reset")
         # If goal has already been created, reset its slots
         if self.goal is not None:
-            tm.sleep(0.05)
             # also reset the hand and pile
             if not partial:
                 self.goal.slots["hand"] = None
@@ -248,7 +303,7 @@ class CognitiveModel(ACTRModel):
             self.goal.slots["gap"] = None
             self.goal.slots["wait"] = None
             self.goal.slots["success"] = None
-            self.time += 0.05
+            self.pass_time(0.05)
         else:
             # if goal chunk does not yet exist, create it
             self._add_goal()
@@ -0,0 +1,134 @@
+# Handlers of the game events sent by the client, each called with the model of the player that sent the event
+from enums import Actor
+import metrics
+import asyncio
+import logging
+import time as tm
+
+log = logging.getLogger('mind.events')  # events received from the client
+narration = logging.getLogger('mind.cognition')
+
+
+def card_played(model, number):
+    log.debug("Player played card(s) %s.", number)
+    model.update_player_hand_size(model.get_player_hand_size() - 1)
+    # player can play more than one card when shuriken is played for example, or when they have consecutive cards
+    # In this card only regard the top card
+    # Tell model here (only need to update top card if the new card is higher than the current top card)
+    model.update_top_card(number, Actor.player)
+
+
+def update_top_card(model, number):
+    model.update_top_card(number, Actor.model)
+
+
+async def shuriken_proposed(model):
+    log.debug("Player proposed shuriken.")
+    model.pause_timer(model.timer)
+    model.reset_timers()
+    # Ask model for response here
+    response = model.get_shuriken_response()
+    # the vote is sent once the model is done deciding, before it deliberates again
+    model.emit_after_latency('shuriken_vote', 'true' if response else 'false')
+    # if model accepts, lower amount of shurikens_left in model
+    if response:
+        model.shurikens_left -= 1
+        narration.debug("I accept the player's shuriken proposal.")
+        model.pause = None
+    else:
+        narration.debug("I reject the player's shuriken proposal.")
+        model.deliberate()
+
+
+def shuriken_vote(model, vote):
+    if vote == 'no':
+        log.debug("Player vetoed and denied my shuriken proposal: %s.", vote)
+        model.set_player_shuriken_response(False)
+    else:
+        model.set_player_shuriken_response(True)
+        log.debug("Player voted yes on my shuriken proposal.")
+
+
+def end_round(model, round):
+    model.end_round(round)
+
+
+def discard_card(model):
+    log.debug("player discarded a card!")
+    model.update_player_hand_size(model.get_player_hand_size() - 1)
+    model.discard_player_card()
+
+
+def reveal_lowest_card(model, card):
+    model.reveal_player_lowest_card(card)
+
+
+def get_life(model, amount):
+    log.debug("Bonus life! %s", amount)
+    model.add_life(amount)
+
+
+def get_shuriken(model, amount):
+    log.debug("Bonus shuriken! %s", amount)
+    model.add_shuriken(amount)
+
+
+def update_model_hand(model, new_hand):
+    log.debug("Update model hand! Model's hand contains the cards: %s", new_hand)
+    # This function is needed because the model hand can change (for example shuriken is played, 
+    # player shows lowest card, which is higher than cards in models hand.
+    # Then all cards in the models hand which are lower than the players lowest card are removed)
+    # It's also called at the start of each round
+    model.update_model_hand(new_hand)
+
+
+# Not sure this event is needed yet
+def update_player_hand_size(model, player_hand_size):
+    log.debug("Update player hand size: %s", player_hand_size)
+    model.update_player_hand_size(player_hand_size)
+
+
+def new_round(model, new_hand):
+    log.debug("New round: %s reset model time and update hand to %s", len(new_hand), new_hand)
+    # Reset timer in new_round
+    model.new_round(new_hand)
+
+
+def new_game(model):
+    log.debug("New Game! reset everything")
+    # reset life count, etc.
+    model.new_game()
+
+
+# event name -> handler
+events = {
+    'card_played': card_played,
+    'update_top_card': update_top_card,
+    'shuriken_proposed': shuriken_proposed,
+    'shuriken_vote': shuriken_vote,
+    'end_round': end_round,
+    'discard_card': discard_card,
+    'reveal_lowest_card': reveal_lowest_card,
+    'get_life': get_life,
+    'get_shuriken': get_shuriken,
+    'update_model_hand': update_model_hand,
+    'update_player_hand_size': update_player_hand_size,
+    'new_round': new_round,
+    'new_game': new_game,
+}
+
+
+# let the model of a player handle an event, their session starts on connect and ends on disconnect
+async def dispatch(sessions, sid, event, *args):
+    start = tm.perf_counter()
+    try:
+        if event == 'connect':
+            sessions.get(sid)
+        elif event == 'disconnect':
+            sessions.remove(sid)
+        else:
+            result = events[event](sessions.get(sid), *args)
+            if asyncio.iscoroutine(result):
+                await result
+    finally:
+        metrics.handler_duration.observe(tm.perf_counter() - start, event=event)
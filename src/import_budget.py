@@ -0,0 +1,94 @@
+# Checks how long the server's modules take to import in a fresh process, which is what every worker pays on start,
+# and that they do not pull in modules that are only meant for analytics, off the gameplay path
+import argparse
+import json
+import subprocess
+import sys
+
+# most milliseconds an import of each module may take, with room for slower machines
+budgets = {
+    'model': 350,
+    'workers': 350,
+    'simulator': 400,
+    'main': 800,
+}
+
+# heavy modules the gameplay path must not import
+forbidden = ('pandas', 'matplotlib', 'scipy')
+
+
+# import module in a fresh process, returning the milliseconds the import took and the forbidden modules it loaded
+def measure(module):
+    code = "import sys, %s; print(','.join(name for name in %r if name in sys.modules))" % (module, forbidden)
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                             check=True)
+    # importtime reports "import time: self [us] | cumulative | imported package" for each module
+    for line in process.stderr.splitlines():
+        _, _, cumulative, name = (part.strip() for part in line.replace(':', '|', 1).split('|'))
+        if name == module:
+            loaded = process.stdout.strip()
+            return int(cumulative) / 1000, loaded.split(',') if loaded else []
+    raise RuntimeError("No import time reported for %s" % module)
+
+
+def run(modules, repeat=5):
+    results = []
+    for module in modules:
+        measurements = [measure(module) for _ in range(repeat)]
+        results.append({
+            'module': module,
+            'min_ms': min(ms for ms, _ in measurements),
+            'budget_ms': budgets.get(module),
+            'forbidden': measurements[0][1],
+        })
+    return results
+
+
+# the modules that went over their budget or imported a forbidden module, and why
+def problems(results):
+    found = []
+    for r in results:
+        if r['budget_ms'] is not None and r['min_ms'] > r['budget_ms']:
+            found.append(f"{r['module']} took {r['min_ms']:.0f} ms, its budget is {r['budget_ms']} ms")
+        if r['forbidden']:
+            found.append(f"{r['module']} imports {', '.join(r['forbidden'])}")
+    return found
+
+
+# compare with an earlier run, returning the modules that got more than threshold times slower to import
+def compare(baseline, results, threshold=1.25):
+    old = {r['module']: r for r in baseline}
+    regressions = []
+    for r in results:
+        if r['module'] not in old:
+            continue
+        ratio = r['min_ms'] / old[r['module']]['min_ms']
+        print(f"{r['module']:>12} {old[r['module']]['min_ms']:8.1f} ms -> {r['min_ms']:8.1f} ms  x{ratio:.2f}")
+        if ratio > threshold:
+            regressions.append(f"{r['module']} imports {ratio:.2f} times slower")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check the import time of the server's modules")
+    parser.add_argument('modules', nargs='*', default=list(budgets), help="modules to import")
+    parser.add_argument('--repeat', type=int, default=5, help="imports per module, the fastest one counts")
+    parser.add_argument('--output', help="file to write the results to, to compare later runs with")
+    parser.add_argument('--compare', help="results of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="slowdown relative to the earlier run that counts as a regression")
+    args = parser.parse_args()
+
+    run_results = run(args.modules, args.repeat)
+    for r in run_results:
+        print(f"{r['module']:>12} {r['min_ms']:8.1f} ms  budget {r['budget_ms']} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run_results, f, indent=2)
+    found = problems(run_results)
+    if args.compare:
+        with open(args.compare) as f:
+            found += compare(json.load(f), run_results, args.threshold)
+    for problem in found:
+        print(problem)
+    sys.exit(1 if found else 0)
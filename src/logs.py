@@ -0,0 +1,60 @@
+# Logging of the server. Every subsystem logs to its own logger under "mind", so its level can be set separately:
+#   mind.server     connections and the server's lifecycle
+#   mind.events     events received from the client
+#   mind.model      changes to the game state and the model's timers
+#   mind.cognition  what the model thinks and decides, by far the most frequent
+#   mind.memory     loading and saving learned memories
+# Messages are only formatted for records that pass the level of their logger, and are written to the stream
+# by a background thread, so logging does not block the event loop on I/O.
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+log_format = '%(asctime)s %(processName)s %(name)s %(levelname)s: %(message)s'
+
+_listener = None
+
+
+def configure(level='INFO', levels=None, stream=None):
+    """
+    Send the records of all mind loggers through a queue to a thread that writes them to stream (stderr by default).
+    level is the level of all mind loggers, levels maps logger names to their own level, e.g. {'mind.cognition': 'DEBUG'}
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(log_format))
+    _listener = QueueListener(records, handler)
+    _listener.start()
+
+    root = logging.getLogger('mind')
+    root.setLevel(level)
+    root.handlers[:] = [QueueHandler(records)]
+    root.propagate = False
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+
+# write the records that are still queued, and stop the background thread
+def stop():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop)
+
+
+# parse logger levels given on the command line as NAME=LEVEL
+def parse_level(text):
+    name, separator, level = text.partition('=')
+    if not separator:
+        raise ValueError("Expected NAME=LEVEL, got %s" % text)
+    if not name.startswith('mind'):
+        name = 'mind.' + name
+    return name, level.upper()
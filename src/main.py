@@ -1,127 +1,115 @@
+import argparse
 import socketio
 from aiohttp import web
+from cogmodel import CognitiveModel
 from model import Model
-from enums import Actor
+from persistence import LearnedMemoryWriter
+from sessions import SessionRegistry
+from workers import WorkerPool
+import handlers
+import logs
+import logging
+import metrics
+import asyncio
+
+log = logging.getLogger('mind.server')
 
 # create a Socket.IO server
 sio = socketio.AsyncServer(cors_allowed_origins='*', logger=False)
 app = web.Application()
 sio.attach(app)
 # app = socketio.WSGIApp(sio)
-model = Model(sio)
-
-
-@sio.event
-def card_played(sid, number):
-    print(f"Player played card(s) {number}.")
-    model.update_player_hand_size(model.get_player_hand_size() - 1)
-    # player can play more than one card when shuriken is played for example, or when they have consecutive cards
-    # In this card only regard the top card
-    # Tell model here (only need to update top card if the new card is higher than the current top card)
-    model.update_top_card(number, Actor.player)
-
-
-@sio.event
-def update_top_card(sid, number):
-    model.update_top_card(number, Actor.model)
-
-
-@sio.event
-async def shuriken_proposed(sid):
-    print(f"Player proposed shuriken.")
-    model.pause_timer(model.timer)
-    model.reset_timers()
-    # Ask model for response here
-    response = model.get_shuriken_response()
-    # if model accepts, lower amount of shurikens_left in model
-    if response:
-        model.shurikens_left -= 1
-        print("I accept the player's shuriken proposal.")
-        model.pause = None
-    else:
-        print("I reject the player's shuriken proposal.")
-        model.deliberate()
-    await sio.emit('shuriken_vote', 'true' if response else 'false')
-
-
-@sio.event
-def shuriken_vote(sid, vote):
-    if vote == 'no':
-        print(f"Player vetoed and denied my shuriken proposal: {vote}.")
-        model.set_player_shuriken_response(False)
+# every connected player gets their own model
+sessions = SessionRegistry(lambda sid: Model(sio, sid))
+# worker processes hosting the models instead of this process, when running with more than one worker
+pool = None
+# models save what they learned in the background, in batches
+learned_memory = LearnedMemoryWriter()
+CognitiveModel.memory_writer = staticmethod(learned_memory.append)
+
+
+# pass an event of a player on to their model
+async def dispatch(sid, event, *args):
+    if pool is not None:
+        pool.dispatch(sid, event, *args)
     else:
-        model.set_player_shuriken_response(True)
-        print(f"Player voted yes on my shuriken proposal.")
+        await handlers.dispatch(sessions, sid, event, *args)
 
 
-@sio.event
-def end_round(sid, round):
-    model.end_round(round)
-
+def forward(event):
+    async def handler(sid, *args):
+        await dispatch(sid, event, *args)
 
-@sio.event
-def discard_card(sid):
-    print(f"player discarded a card!")
-    model.update_player_hand_size(model.get_player_hand_size() - 1)
-    model.discard_player_card()
+    return handler
 
 
-@sio.event
-def reveal_lowest_card(sid, card):
-    model.reveal_player_lowest_card(card)
-
-
-@sio.event
-def get_life(sid, amount):
-    print("Bonus life!", amount)
-    model.add_life(amount)
+for game_event in handlers.events:
+    sio.on(game_event, forward(game_event))
 
 
 @sio.event
-def get_shuriken(sid, amount):
-    print("Bonus shuriken!", amount)
-    model.add_shuriken(amount)
+async def connect(sid, environ):
+    log.info('connect sid: %s', sid)
+    await dispatch(sid, 'connect')
 
 
 @sio.event
-def update_model_hand(sid, new_hand):
-    print(f"Update model hand! Model's hand contains the cards: {new_hand}")
-    # This function is needed because the model hand can change (for example shuriken is played, 
-    # player shows lowest card, which is higher than cards in models hand.
-    # Then all cards in the models hand which are lower than the players lowest card are removed)
-    # It's also called at the start of each round
-    model.update_model_hand(new_hand)
+async def disconnect(sid):
+    log.info('disconnect sid: %s', sid)
+    await dispatch(sid, 'disconnect')
 
 
-@sio.event  # Not sure this event is needed yet
-def update_player_hand_size(sid, player_hand_size):
-    print(f"Update player hand size: {player_hand_size}")
-    model.update_player_hand_size(player_hand_size)
+# metrics of this process and of the workers, in the Prometheus text format
+async def get_metrics(request):
+    if pool is None:
+        text = metrics.registry.render()
+    else:
+        snapshots = [((('process', 'main'),), metrics.registry.snapshot())]
+        snapshots += [((('process', 'worker-%d' % index),), snapshot)
+                      for index, snapshot in sorted(pool.metrics.items())]
+        text = metrics.registry.render(snapshots)
+    return web.Response(body=text.encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
 
 
-@sio.event
-def new_round(sid, new_hand):
-    print(f"New round: {len(new_hand)} reset model time and update hand to {new_hand}")
-    # Reset timer in new_round
-    model.new_round(new_hand)
+app.router.add_get('/metrics', get_metrics)
 
 
-@sio.event
-def new_game(sid):
-    print(f"New Game! reset everything")
-    # reset life count, etc.
-    model.new_game()
+async def start_sessions(app):
+    app['loop_monitor'] = asyncio.ensure_future(metrics.monitor_event_loop())
+    learned_memory.start()
+    if pool is not None:
+        app['relay'] = asyncio.ensure_future(pool.relay(sio, learned_memory.append))
+    else:
+        app['session_eviction'] = asyncio.ensure_future(sessions.evict_periodically())
 
 
-@sio.event
-def connect(sid, environ):
-    print('connect sid:', sid)
+async def stop_sessions(app):
+    app['loop_monitor'].cancel()
+    if pool is not None:
+        # keep relaying while the workers save their sessions
+        await asyncio.get_running_loop().run_in_executor(None, pool.stop)
+        await app['relay']
+    else:
+        app['session_eviction'].cancel()
+        sessions.clear()
+    await learned_memory.close()
 
 
-@sio.event
-def disconnect(sid):
-    print('disconnect sid:', sid)
+app.on_startup.append(start_sessions)
+app.on_shutdown.append(stop_sessions)
 
 
 if __name__ == '__main__':
-    web.run_app(app, port=5000)
+    parser = argparse.ArgumentParser(description="Server for playing The Mind against a cognitive model")
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=1, help="number of processes hosting the models")
+    parser.add_argument('--log-level', default='INFO', type=str.upper, help="level of all server logs")
+    parser.add_argument('--log', type=logs.parse_level, action='append', default=[], metavar='NAME=LEVEL',
+                        help="level of one subsystem's logs, e.g. cognition=DEBUG to follow the model's reasoning")
+    args = parser.parse_args()
+    log_settings = {'level': args.log_level, 'levels': dict(args.log)}
+    logs.configure(**log_settings)
+    if args.workers > 1:
+        pool = WorkerPool(args.workers, log_settings)
+        pool.start()
+    web.run_app(app, port=args.port)
@@ -0,0 +1,146 @@
+from array import array
+from numbers import Number
+import numpy as np
+
+
+class DeclarativeMemory(object):
+    """
+    Declarative memory of an ACT-R model: all chunks, stored behind a name-keyed index
+    so lookups and inserts take constant time regardless of the number of chunks.
+    An inverted index on (slot, value) pairs narrows retrieval requests down to the
+    chunks that match them, and numeric slot values are also kept in columns so they
+    can be compared for many chunks at once.
+
+    A memory can be layered on top of a frozen base memory that is shared by many models.
+    It then only stores its own new chunks, plus copies of the base chunks it changed.
+    """
+
+    def __init__(self, base=None):
+        self.base = base  # frozen memory this memory extends, or None
+        self.frozen = False  # a frozen memory cannot change anymore
+        self.chunks = {}  # chunk name -> Chunk, in order of insertion
+        self.index = {}  # (slot, value) -> names of the chunks with that value in that slot, in order of insertion
+        self.version = 0  # incremented whenever chunks are added or fans change
+        self.rows = {}  # chunk name -> row of the chunk in the columns
+        self.columns = {}  # slot -> numeric value of that slot per row, nan if a chunk has no numeric value there
+        self.shadowed = 0  # number of base chunks replaced by a changed copy in this memory
+
+    def get(self, name):
+        """
+        Find the Chunk given its name, or None if no such chunk exists
+        """
+        try:
+            chunk = self.chunks.get(name)
+        except TypeError:  # unhashable slot values can never be chunk names
+            return None
+        if chunk is None and self.base is not None:
+            return self.base.get(name)
+        return chunk
+
+    def get_writable(self, name):
+        """
+        Find the Chunk given its name, to change it. A chunk from the base memory is copied into this memory first.
+        """
+        chunk = self.chunks.get(name)
+        if chunk is None and self.base is not None:
+            chunk = self.base.get(name)
+            if chunk is not None:
+                chunk = chunk.copy()
+                self._insert(chunk)
+                self.shadowed += 1
+        return chunk
+
+    def add(self, chunk):
+        """
+        Add a new chunk to memory. A chunk by this name must not exist yet.
+        """
+        if self.get(chunk.name) is not None:
+            raise ValueError("A chunk named %s already exists in DM" % str(chunk.name))
+        self._insert(chunk)
+
+    def _insert(self, chunk):
+        if self.frozen:
+            raise ValueError("Cannot change a frozen DM")
+        row = len(self.chunks)
+        self.chunks[chunk.name] = chunk
+        self.rows[chunk.name] = row
+        self.version += 1
+        for slot_value in chunk.slots.items():
+            self.index.setdefault(slot_value, {})[chunk.name] = None
+
+        for slot, value in chunk.slots.items():
+            if isinstance(value, Number) and slot not in self.columns:
+                self.columns[slot] = array('d', [np.nan]) * row
+        for slot, column in self.columns.items():
+            value = chunk.slots.get(slot)
+            column.append(value if isinstance(value, Number) else np.nan)
+
+    def find(self, slots):
+        """
+        Return all chunks that have the specified value in each of the specified slots, in order of insertion
+        """
+        found = self._find_own(slots)
+        if self.base is None:
+            return found
+        # chunks changed in this memory replace their original in the base
+        return [ch for ch in self.base.find(slots) if ch.name not in self.chunks] + found
+
+    def _find_own(self, slots):
+        if not slots:
+            return list(self.chunks.values())
+
+        postings = []
+        for slot_value in slots.items():
+            posting = self.index.get(slot_value)
+            if not posting:
+                return []
+            postings.append(posting)
+
+        # Walk the smallest posting and check the others for membership
+        postings.sort(key=len)
+        smallest, others = postings[0], postings[1:]
+        return [self.chunks[name] for name in smallest if all(name in posting for posting in others)]
+
+    def column(self, chunks, slot):
+        """
+        Return the numeric values of the specified slot for the specified chunks as an array,
+        with nan for chunks that do not have a numeric value in that slot
+        """
+        if self.base is not None:
+            own = np.fromiter((ch.name in self.rows for ch in chunks), dtype=bool, count=len(chunks))
+            if not own.all():
+                values = np.empty(len(chunks))
+                values[own] = self.column([ch for ch, o in zip(chunks, own) if o], slot)
+                values[~own] = self.base.column([ch for ch, o in zip(chunks, own) if not o], slot)
+                return values
+
+        if slot not in self.columns:
+            return np.full(len(chunks), np.nan)
+        rows = np.fromiter((self.rows[ch.name] for ch in chunks), dtype=np.intp, count=len(chunks))
+        return np.frombuffer(self.columns[slot])[rows]
+
+    def increment_fan(self, name):
+        """
+        Register one more chunk referring to the chunk with the given name.
+        """
+        self.get_writable(name).fan += 1
+        self.version += 1
+
+    def freeze(self):
+        """
+        Prevent any further changes, so this memory can safely be shared as the base of other memories
+        """
+        self.frozen = True
+
+    def __contains__(self, chunk):
+        return self.get(chunk.name) is chunk
+
+    def __iter__(self):
+        if self.base is not None:
+            for chunk in self.base:
+                if chunk.name not in self.chunks:
+                    yield chunk
+        yield from self.chunks.values()
+
+    def __len__(self):
+        return len(self.chunks) - self.shadowed + (len(self.base) if self.base is not None else 0)
@@ -0,0 +1,145 @@
+# Instrumentation of the server: how long event handlers take, how late timers fire and how far the event loop lags,
+# exposed in the Prometheus text format
+import asyncio
+from bisect import bisect_left
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Histogram:
+    """
+    Counts observations in cumulative buckets, separately for every combination of label values.
+    """
+    type = "histogram"
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # sorted label pairs -> [count per bucket and +Inf (not cumulative), sum of observations]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def snapshot(self):
+        return {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+
+    def render(self, snapshot, extra_labels=()):
+        lines = []
+        for key, (counts, total) in sorted(snapshot.items()):
+            labels = tuple(extra_labels) + key
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append("%s_bucket%s %d" % (self.name, _format_labels(labels + (('le', _format_value(bound)),)),
+                                                 cumulative))
+            lines.append("%s_sum%s %s" % (self.name, _format_labels(labels), _format_value(total)))
+            lines.append("%s_count%s %d" % (self.name, _format_labels(labels), cumulative))
+        return lines
+
+
+class Gauge:
+    """
+    Holds the last value that was set, separately for every combination of label values.
+    """
+    type = "gauge"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._series = {}  # sorted label pairs -> value
+
+    def set(self, value, **labels):
+        self._series[tuple(sorted(labels.items()))] = value
+
+    def snapshot(self):
+        return dict(self._series)
+
+    def render(self, snapshot, extra_labels=()):
+        return ["%s%s %s" % (self.name, _format_labels(tuple(extra_labels) + key), _format_value(value))
+                for key, value in sorted(snapshot.items())]
+
+
+class Registry:
+    """
+    The metrics of a process. A snapshot of them is plain data, so the metrics of worker processes can be sent
+    to the main process and exposed together with its own.
+    """
+
+    def __init__(self):
+        self._metrics = {}  # name -> metric, in order of registration
+
+    def histogram(self, name, help, buckets):
+        return self._register(Histogram(name, help, buckets))
+
+    def gauge(self, name, help):
+        return self._register(Gauge(name, help))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError("A metric named %s already exists" % metric.name)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    # render snapshots in the Prometheus text format, given as pairs of the labels to add to all their series
+    # and the snapshot itself. By default only the metrics of this process are rendered
+    def render(self, snapshots=None):
+        if snapshots is None:
+            snapshots = [((), self.snapshot())]
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append("# HELP %s %s" % (name, metric.help))
+            lines.append("# TYPE %s %s" % (name, metric.type))
+            for labels, snapshot in snapshots:
+                lines.extend(metric.render(snapshot.get(name, {}), labels))
+        return "\n".join(lines) + "\n"
+
+
+# bucket bounds in seconds
+latency_buckets = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+registry = Registry()
+handler_duration = registry.histogram('mind_handler_duration_seconds',
+                                      "Time the event loop spent handling a game event, by event", latency_buckets)
+timer_skew = registry.histogram('mind_timer_skew_seconds',
+                                "How much later than intended a model timer fired, by callback", latency_buckets)
+loop_lag = registry.histogram('mind_event_loop_lag_seconds',
+                              "How much later than intended the event loop woke up a sleeping task", latency_buckets)
+last_loop_lag = registry.gauge('mind_event_loop_last_lag_seconds', "Last measured lag of the event loop")
+
+
+# measure how late the event loop wakes up a task that sleeps for interval seconds, run as a background task
+async def monitor_event_loop(interval=0.25):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        loop_lag.observe(lag)
+        last_loop_lag.set(lag)
+
+
+# send a snapshot of this process' metrics every interval seconds, run as a background task in worker processes
+async def report_periodically(send, interval=5):
+    while True:
+        await asyncio.sleep(interval)
+        send(registry.snapshot())
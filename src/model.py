@@ -1,10 +1,12 @@
-from timer import Timer
-import time as tm
-import numpy as np
+from timer import Scheduler
 from cogmodel import CognitiveModel
 from enums import Success, Actor
+import logging
 import temporal
 
+log = logging.getLogger('mind.model')  # changes to the game state and the model's timers
+narration = logging.getLogger('mind.cognition')  # what the model thinks and decides
+
 
 # Written by: I.D.M. Akrum and R. Bijlsma
 # Source code: https://github.com/RuurdBijlsma/mind-server
@@ -12,8 +14,8 @@ import temporal
 
 
 class Model(CognitiveModel):
-    def __init__(self, sio=None):
-        super().__init__()
+    def __init__(self, sio=None, sid=None, seed=None, scheduler=None):
+        super().__init__(seed)
         # game-state
         self.shurikens_left = -1
         self.lives_left = -1
@@ -24,23 +26,24 @@ class Model(CognitiveModel):
         self.reset_game()
         if sio is not None:
             self.sio = sio
+        self.sid = sid  # connection of the player this model plays with
         # timers
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
         self.timer = None  # for playing a card
         self.check_in = None  # for checking in after some time
         self.discard_timer = None  # for discarding a card
         self.wait_time = 0  # keep track of how long the model's waited real-time
-        self.pause = None  # keep track of how long the model still has to wait in a pause
+        self.pause = None  # paused timer for playing a card, e.g. while a shuriken is proposed
 
     # the "main" function of the model which decides all model action
     def deliberate(self):
         self.check_goal()
         goal = self.goal
 
-        print(f"I'm deliberating about what to do next.")
+        narration.debug("I'm deliberating about what to do next.")
 
         # add time for production to fire
-        tm.sleep(0.05)
-        self.time += 0.05
+        self.pass_time(0.05)
 
         # copy variables for easier use
         hand = goal.slots["hand"]
@@ -51,7 +54,7 @@ class Model(CognitiveModel):
 
         # process last play 
         if success is not None and success[0] == Success.pending:
-            print("I'm evaluating the last played card...")
+            narration.debug("I'm evaluating the last played card...")
             self.determine_success(success, hand, pile)
             if self.timer is None:
                 self.deliberate()
@@ -66,72 +69,74 @@ class Model(CognitiveModel):
 
         # if you have no lives left (and you've processed feedback from last play), stop playing
         if self.lives_left <= 0:
-            print("Unfortunately, we have no lives left.")
+            narration.debug("Unfortunately, we have no lives left.")
             self.append_learned_memory()
             return
 
         # if we're in the middle of processing a shuriken
         if self.using_shuriken[0]:
-            print("We're processing a shuriken right now.")
+            narration.debug("We're processing a shuriken right now.")
             # model is still discarding its lowest card
             if self.discard_timer is not None:
                 return
             # play cards lower than player card
             if hand is not None and hand < self.using_shuriken[1]:
-                print(f"I know my card ({hand}) is lower than the player's lowest card ({self.using_shuriken[1]}).")
-                print(f"I'll play {hand} immediately.")
-                self.timer = Timer(self.get_movement_time(), self.play_lowest_card)
+                narration.debug("I know my card (%s) is lower than the player's lowest card (%s).",
+                                hand, self.using_shuriken[1])
+                narration.debug("I'll play %s immediately.", hand)
+                self.timer = self.start_timer(self.get_movement_time(), self.play_lowest_card)
             else:
                 # reset using_shuriken
-                print("I don't have any cards lower than the player's lowest card.")
-                print("We're done processing the shuriken.")
+                narration.debug("I don't have any cards lower than the player's lowest card.")
+                narration.debug("We're done processing the shuriken.")
                 self.using_shuriken = False, None
                 self.deliberate()
             return
 
         # if hand is empty (and latest feedback has been processed), there is nothing left to do
         if len(self.hand) == 0:
-            print("My hand is empty. There's nothing left for me to do.")
+            narration.debug("My hand is empty. There's nothing left for me to do.")
             return
 
         # if you were playing a card, but paused for any reason, continue waiting
         if self.pause is not None:
             lowest_card = self.get_lowest_card()
-            print(f"Still waiting {self.pause:.2f} seconds before playing {lowest_card}.")
-            self.timer = Timer(self.pause, self.play_lowest_card)
+            narration.debug("Still waiting %.2f seconds before playing %s.", self.pause.remaining(), lowest_card)
+            self.timer = self.pause
             self.pause = None
+            self.timer.resume(delay=self.remaining_latency())
             return
 
         # if a higher card was played than in the model's hand, discard those lower cards first
         if hand is not None and hand < pile:
             if self.discard_timer is None:
-                print(f"My card ({hand}) is lower than the pile. I'll discard it before continuing.")
-                self.discard_timer = Timer(self.get_movement_time(), self.discard_lowest_card)
+                narration.debug("My card (%s) is lower than the pile. I'll discard it before continuing.", hand)
+                self.discard_timer = self.start_timer(self.get_movement_time(), self.discard_lowest_card)
             return
 
         # if player's hand is empty, model plays all its left-over cards
         if self.get_player_hand_size() == 0:
-            print("The player's hand is empty.")
+            narration.debug("The player's hand is empty.")
             # if model's hand "exists", i.e. it is not empty
             if self.hand and hand > pile:
                 # if player isn't already in the process of playing a card
                 if self.timer is None:
-                    self.timer = Timer(self.get_movement_time(), self.play_lowest_card)
+                    self.timer = self.start_timer(self.get_movement_time(), self.play_lowest_card)
                 return
 
         # refrain from doing anything with a 100 card if player still has cards
         if hand == 100 and self.get_player_hand_size() != 0:
-            print("My card is 100, so I'll wait till the player is out of cards.")
+            narration.debug("My card is 100, so I'll wait till the player is out of cards.")
             return
 
         # Model knows its hand and the deck top card, but does not yet know the gap
         if hand is not None and gap is None:
             new_gap = self.determine_gap(hand, pile)
             self.goal.slots["gap"] = new_gap
-            print(f"I'm calculating the difference between {hand} and {pile}...", "the calculated gap is", new_gap)
+            narration.debug("I'm calculating the difference between %s and %s... the calculated gap is %s",
+                            hand, pile, new_gap)
             # add time for modifying goal buffer
-            tm.sleep(0.05)
-            self.time += 0.05
+            self.pass_time(0.05)
             self.reset_imaginal()
             self.deliberate()
             return
@@ -140,35 +145,49 @@ class Model(CognitiveModel):
         if gap is not None and wait is None:
             # play immediately (with randomness) with a gap of 1
             if gap == 1:
-                print("The gap is only 1, I'll play my card immediately.")
-                self.goal.slots["wait"] = temporal.time_to_pulses(self.get_movement_time())
+                narration.debug("The gap is only 1, I'll play my card immediately.")
+                self.goal.slots["wait"] = temporal.time_to_pulses(self.get_movement_time(), rng=self.rng)
             else:
                 # decide how long to wait
-                print(f"I'm deciding how long to wait with a gap of {gap}.")
+                narration.debug("I'm deciding how long to wait with a gap of %s.", gap)
                 pulses = self.get_wait_time(gap)
                 self.goal.slots["wait"] = pulses
             # add time for modifying goal buffer
-            tm.sleep(0.05)
-            self.time += 0.05
+            self.pass_time(0.05)
             self.deliberate()
             return
 
         # Model knows how long to wait and hasn't started waiting yet
         if wait is not None and success is None:
-            seconds = temporal.pulses_to_time(wait)
+            seconds = temporal.pulses_to_time(wait, rng=self.rng)
             lowest_card = self.get_lowest_card()
-            print(f"Waiting {seconds:.2f} seconds before playing {lowest_card}")
+            narration.debug("Waiting %.2f seconds before playing %s", seconds, lowest_card)
             # time it takes for the model to perform a movement
             mt = self.get_movement_time()
             timeout = seconds + mt
+            # the model starts waiting once it is done thinking
+            latency = self.remaining_latency()
             # set wait time as starting time (minus movement time)
-            self.wait_time = tm.time() - mt
-            self.timer = Timer(timeout, self.play_lowest_card)
+            self.wait_time = self.now() + latency - mt
+            self.timer = self.start_timer(timeout, self.play_lowest_card, delay=latency)
             if timeout > 20:
-                self.check_in = Timer(20, self.check_time)
+                self.check_in = self.start_timer(20, self.check_time, delay=latency)
             return
 
-        print("I don't know what to do...")
+        narration.debug("I don't know what to do...")
+
+    # send an event to the player this model plays with
+    async def emit(self, event, data=None):
+        await self.sio.emit(event, data, to=self.sid)
+
+    # send an answer once the model is done with the cognitive steps taken so far, as the player would see it.
+    # Resetting the timers does not cancel it, the player waits for the answer
+    def emit_after_latency(self, event, data=None):
+        async def answer():
+            await self.emit(event, data)
+
+        answer.__name__ = event
+        return self.scheduler.call_later(self.remaining_latency(), answer, resettable=False)
 
     # model plays its lowest card
     async def play_lowest_card(self):
@@ -178,18 +197,18 @@ class Model(CognitiveModel):
     # model plays a card
     async def play_card(self, card):
         if card not in self.hand:
-            print("Cannot play card that is not in model's hand!")
+            log.warning("Cannot play card that is not in model's hand!")
             return
-        print("play_card", card)
+        log.debug("play_card %s", card)
         self.hand.remove(card)
         # model "sees" change in game-state
         self.set_hand(self.get_lowest_card())
-        await self.sio.emit('play_card', card)
+        await self.emit('play_card', card)
         self.update_top_card(card, Actor.model)
 
     # shuriken was activated so model discards lowest card, this doesn't lose a life
     async def shuriken_discard_lowest_card(self):
-        print("Discard card through shuriken!")
+        narration.debug("Discard card through shuriken!")
         lowest_card = self.get_lowest_card()
         await self.discard_card(lowest_card, shuriken=True)
 
@@ -201,15 +220,15 @@ class Model(CognitiveModel):
     # model discards a card (removed from hand but not added to pile)
     async def discard_card(self, card, shuriken=False):
         if card not in self.hand:
-            print("Cannot discard card that is not in model's hand!")
+            log.warning("Cannot discard card that is not in model's hand!")
             return
-        print(f"Discarding {card}.")
+        narration.debug("Discarding %s.", card)
         self.hand.remove(card)
         self.update_model_hand(self.hand)
         if shuriken:
-            await self.sio.emit('shuriken_discard_card', card)
+            await self.emit('shuriken_discard_card', card)
         else:
-            await self.sio.emit('discard_card', card)
+            await self.emit('discard_card', card)
 
     # process when a player discards a card
     def discard_player_card(self):
@@ -224,7 +243,7 @@ class Model(CognitiveModel):
             lowest_card = self.get_lowest_card()
             # if the player's lowest card is lower than ours
             if lowest_card is not None and lowest_card > self.using_shuriken[1]:
-                print("The player's lowest card was lower than mine.")
+                narration.debug("The player's lowest card was lower than mine.")
                 # we finished processing the shuriken
                 self.using_shuriken = False, None
         # self.reset_timers()
@@ -232,7 +251,7 @@ class Model(CognitiveModel):
 
     # function to process a change in the top card of the pile
     def update_top_card(self, new_top_card, actor):
-        print("update_top_card", new_top_card)
+        log.debug("update_top_card %s", new_top_card)
         current_top_card = self.get_top_card()
         if new_top_card > current_top_card:
             self.deck_top_card = new_top_card
@@ -245,7 +264,7 @@ class Model(CognitiveModel):
 
     # function returns top card
     def get_top_card(self):
-        print("get_top_card", self.deck_top_card)
+        log.debug("get_top_card %s", self.deck_top_card)
         return self.deck_top_card
 
     # remember who played the last card and set success of that play to pending
@@ -260,13 +279,13 @@ class Model(CognitiveModel):
             # model just played and player still has cards
             if actor == Actor.model and self.get_player_hand_size() > 0:
                 self.goal.slots["success"] = (Success.pending, Actor.model)
-                self.wait_time = tm.time() - self.wait_time
-                print(f"I waited {self.wait_time:.2f} s to play the card.")
+                self.wait_time = self.now() - self.wait_time
+                narration.debug("I waited %.2f s to play the card.", self.wait_time)
             # actor just played and we still have cards
             if actor == Actor.player and self.hand:
                 self.goal.slots["success"] = (Success.pending, Actor.player)
-                self.wait_time = tm.time() - self.wait_time
-                print(f"I was waiting {self.wait_time:.2f} s when the player played a card.")
+                self.wait_time = self.now() - self.wait_time
+                narration.debug("I was waiting %.2f s when the player played a card.", self.wait_time)
         elif self.goal.slots["success"] == (Success.pending, Actor.model) \
                 and self.timer is not None:
             # if we're waiting to see whether our card was successful and player plays a card
@@ -274,8 +293,7 @@ class Model(CognitiveModel):
             self.timer.cancel()
             self.timer = None
             self.goal.slots["success"] = Success.success, Actor.model
-        tm.sleep(0.05)
-        self.time += 0.05
+        self.pass_time(0.05)
 
     # determine whether the last play was successful
     def determine_success(self, success, hand, pile):
@@ -283,8 +301,8 @@ class Model(CognitiveModel):
         if success[1] == Actor.model:
             if self.timer is None:
                 wait = 4 + 0.05
-                print(f"Giving player {wait} seconds to object to my card.")
-                self.timer = Timer(wait, self.set_success)
+                narration.debug("Giving player %s seconds to object to my card.", wait)
+                self.timer = self.start_timer(wait, self.set_success)
             else:
                 return
         # if the player played last
@@ -292,10 +310,10 @@ class Model(CognitiveModel):
             # we lose a life if we still had a lower card than the last played card in hand
             if hand is not None and hand < pile:
                 self.life_lost(caused_by_human=False)
-                self.discard_timer = Timer(self.get_movement_time(), self.discard_lowest_card)
+                self.discard_timer = self.start_timer(self.get_movement_time(), self.discard_lowest_card)
             else:
                 # we only have cards higher than the last played card, but the gap has changed
-                print("The situation's changed. Recalculating...")
+                narration.debug("The situation's changed. Recalculating...")
                 self.reset_goal(partial=True)
 
     # model decides its card was played successfully
@@ -303,14 +321,14 @@ class Model(CognitiveModel):
         self.check_goal()
         success = self.goal.slots["success"]
         if success is not None and success[0] == Success.pending:
-            print("My card was played successfully.")
+            narration.debug("My card was played successfully.")
             self.goal.slots["success"] = (Success.success, Actor.model)
             self.time += 0.05
         self.deliberate()
 
     # process when a life is lost
     def life_lost(self, caused_by_human):
-        print("life_lost")
+        log.debug("life_lost")
         self.lives_left -= 1
         self.check_goal()
         # update the model with to the correct situation
@@ -320,62 +338,61 @@ class Model(CognitiveModel):
         else:
             # model played a card too late
             self.goal.slots["success"] = Success.late, Actor.model
-        tm.sleep(0.05)
-        self.time += 0.05
+        self.pass_time(0.05)
 
     # process the feedback from the last card play
     def process_feedback(self, success, gap, time):
         self.check_goal()
         if success is None or gap is None or time is None:
-            print("I'm missing some information and can't process the feedback.")
+            narration.debug("I'm missing some information and can't process the feedback.")
             return
 
-        print(f"I'm processing feedback for waiting {time} pulses for gap {gap}...")
+        narration.debug("I'm processing feedback for waiting %s pulses for gap %s...", time, gap)
 
         # model played a card too early
         if success[0] == Success.early:
             # set new time as 15% later than the model played (and a life was lost)
             new_time = time + (time * 0.15)
             self.add_wait_fact(gap, new_time)
-            print(f"I should have waited longer; I will try waiting {new_time} for gap {gap}.")
+            narration.debug("I should have waited longer; I will try waiting %s for gap %s.", new_time, gap)
 
         # model played a card too late
         if success[0] == Success.late:
             # set new time as 15% earlier than that the player played (and a life was lost)
-            pulses = temporal.time_to_pulses(self.wait_time)
+            pulses = temporal.time_to_pulses(self.wait_time, rng=self.rng)
             new_time = pulses - (pulses * 0.15)
             self.add_wait_fact(gap, new_time)
-            print(f"I should have played sooner; I will try waiting {new_time} for gap {gap}.")
+            narration.debug("I should have played sooner; I will try waiting %s for gap %s.", new_time, gap)
 
         # model played a card just right
         if success[0] == Success.success:
             # add new encounter of the successful wait fact
             self.add_wait_fact(gap, time, add_to_csv=True)
-            print(f"Waiting {time} worked out; I will wait that long again next time I see gap {gap}.")
+            narration.debug("Waiting %s worked out; I will wait that long again next time I see gap %s.", time, gap)
         self.wait_time = 0
 
     # check how long the model still has to wait
     async def check_time(self, long_time=15):
         if self.timer is not None:
-            print("How long should I still wait?")
-            temp_time = tm.time() - self.wait_time
-            time_diff = self.timer.get_timeout() - temp_time
-            print(f"I've waited {temp_time:.2f} s and still need to wait {time_diff:.2f} s.")
+            narration.debug("How long should I still wait?")
+            temp_time = self.now() - self.wait_time
+            time_diff = self.timer.remaining()
+            narration.debug("I've waited %.2f s and still need to wait %.2f s.", temp_time, time_diff)
             # if the model still needs to wait a long time, it might propose a shuriken
             if time_diff >= long_time:
-                print("Should I propose a shuriken?")
+                narration.debug("Should I propose a shuriken?")
                 if self.shurikens_left <= 0:
-                    print("We have no shuriken...")
-                    print("I'll just keep waiting then.")
+                    narration.debug("We have no shuriken...")
+                    narration.debug("I'll just keep waiting then.")
                 else:
                     proposed = await self.propose_shuriken()
                     if not proposed:
-                        print("I'll keep waiting.")
-                        self.check_in = Timer(long_time, self.check_time)
+                        narration.debug("I'll keep waiting.")
+                        self.check_in = self.start_timer(long_time, self.check_time)
                     else:
-                        print("Waiting on shuriken response from player...")
+                        narration.debug("Waiting on shuriken response from player...")
             else:
-                print("I'll play my card soon.")
+                narration.debug("I'll play my card soon.")
 
     # propose to use a shuriken
     async def propose_shuriken(self):
@@ -384,27 +401,33 @@ class Model(CognitiveModel):
         # same rules for proposing a shuriken apply as for responding to shuriken proposal
         propose = self.get_shuriken_response()
         if propose:
-            print("I'll propose a shuriken.")
-            await self.sio.emit('propose_shuriken')
+            narration.debug("I'll propose a shuriken.")
             # pause current play while the shuriken is being proposed
             self.pause_timer(self.timer)
             self.reset_timers()
+            self.emit_after_latency('propose_shuriken')
             return True
         else:
-            print("I won't propose a shuriken.")
+            narration.debug("I won't propose a shuriken.")
             return False
 
-    # pause timer and set self.pause to remaining time on timer
+    # start a timer that goes off timeout seconds after delay, by default once the model is done thinking
+    def start_timer(self, timeout, callback, delay=None):
+        if delay is None:
+            delay = self.remaining_latency()
+        return self.scheduler.call_later(delay + timeout, callback)
+
+    # pause timer and keep it in self.pause, to be resumed when the model deliberates again
     def pause_timer(self, timer):
         if timer is None:
-            print("No timer to pause.")
+            narration.debug("No timer to pause.")
             return
-        temp_time = tm.time() - self.wait_time
-        time_diff = timer.get_timeout() - temp_time
-        if time_diff <= 0:
-            print("Unable to pause on-going timer.")
+        if timer.pause() <= 0:
+            narration.debug("Unable to pause on-going timer.")
             return
-        self.pause = time_diff
+        self.pause = timer
+        if timer is self.timer:
+            self.timer = None
 
     # return the model's lowest card
     def get_lowest_card(self):
@@ -416,10 +439,10 @@ class Model(CognitiveModel):
 
     # function to determine if model accepts a shuriken proposal or not
     def get_shuriken_response(self, gap_threshold=20):
-        print("get_shuriken_response")
+        log.debug("get_shuriken_response")
         # model's hand is 100 card (always played last)
         if self.get_lowest_card() == 100:
-            print("The card in my hand is 100, so I don't want to use a shuriken.")
+            narration.debug("The card in my hand is 100, so I don't want to use a shuriken.")
             return False
         self.check_goal()
         gap = self.goal.slots["gap"]
@@ -427,44 +450,44 @@ class Model(CognitiveModel):
         p = [0.5, 0.5]  # default 50/50 chance of rejecting or accepting
         # if gap is None, the model's lowest card hasn't been processed properly
         if gap is None:
-            print("Things changed too fast. I need more time to think.")
+            narration.debug("Things changed too fast. I need more time to think.")
             return False
         # you have more than 1 lives, but only 1 shuriken
         if self.lives_left > 1 == self.shurikens_left:
-            print(f"I have only 1 shuriken and {self.lives_left} lives.")
+            narration.debug("I have only 1 shuriken and %s lives.", self.lives_left)
             # the gap is small
             if gap < gap_threshold:
-                print(f"The gap is {gap}, which I consider small.")
+                narration.debug("The gap is %s, which I consider small.", gap)
                 p = [0.1, 0.9]  # high probability of rejecting
             else:
-                print(f"The gap is {gap}, which I consider big.")
+                narration.debug("The gap is %s, which I consider big.", gap)
                 p = [0.3, 0.7]  # probability biased towards rejecting
         # you have 1 (or more) shuriken, but only 1 life
         if self.lives_left == 1 <= self.shurikens_left:
-            print(f"I have only 1 life and {self.shurikens_left} shuriken.")
+            narration.debug("I have only 1 life and %s shuriken.", self.shurikens_left)
             # the gap is large
             if gap >= gap_threshold:
-                print(f"The gap is {gap}, which I consider big.")
+                narration.debug("The gap is %s, which I consider big.", gap)
                 p = [0.9, 0.1]  # high probability of accepting
             else:
-                print(f"The gap is {gap}, which I consider small.")
+                narration.debug("The gap is %s, which I consider small.", gap)
                 p = [0.7, 0.3]  # probability biased towards accepting
         # you have the same amount of shuriken and lives
         if self.lives_left == self.shurikens_left:
-            print(f"I have {self.lives_left} lives and {self.shurikens_left} shuriken.")
+            narration.debug("I have %s lives and %s shuriken.", self.lives_left, self.shurikens_left)
             # the gap is large
             if gap >= gap_threshold:
-                print(f"The gap is {gap}, which I consider big.")
+                narration.debug("The gap is %s, which I consider big.", gap)
                 p = [0.6, 0.4]  # slight bias towards accepting
             else:
-                print(f"The gap is {gap}, which I consider small.")
+                narration.debug("The gap is %s, which I consider small.", gap)
                 p = [0.4, 0.6]  # slight bias toward rejecting
-        print(f"The chance I'll propose or accept a shuriken is {p[0]}.")
-        return np.random.choice(choices, p=p)
+        narration.debug("The chance I'll propose or accept a shuriken is %s.", p[0])
+        return self.rng.choice(choices, p=p)
 
     # process the player's response to a shuriken
     def set_player_shuriken_response(self, response):
-        print("set_player_shuriken_response")
+        log.debug("set_player_shuriken_response")
         if response:
             self.shurikens_left -= 1
             self.pause = None
@@ -474,35 +497,35 @@ class Model(CognitiveModel):
 
     # set using shuriken as true as save the player's lowest card
     def reveal_player_lowest_card(self, card):
-        print("Shuriken reveals player's lowest card", card)
+        narration.debug("Shuriken reveals player's lowest card %s", card)
         self.using_shuriken = True, card
-        print("I need to discard my lowest card", self.get_lowest_card())
-        self.discard_timer = Timer(self.get_movement_time(), self.shuriken_discard_lowest_card)
+        narration.debug("I need to discard my lowest card %s", self.get_lowest_card())
+        self.discard_timer = self.start_timer(self.get_movement_time(), self.shuriken_discard_lowest_card)
         # self.deliberate()
 
     # add one or more lives to the model
     def add_life(self, amount):
-        print("add life")
+        log.debug("add life")
         self.lives_left += amount
 
     # add one or more shuriken to the model
     def add_shuriken(self, amount):
-        print("add shuriken")
+        log.debug("add shuriken")
         self.shurikens_left += amount
 
     # return player's hand size
     def get_player_hand_size(self):
-        print("get_player_hand_size", self.player_hand_size)
+        log.debug("get_player_hand_size %s", self.player_hand_size)
         return self.player_hand_size
 
     # update player's hand size
     def update_player_hand_size(self, new_hand_size):
-        print("update_player_hand_size", new_hand_size)
+        log.debug("update_player_hand_size %s", new_hand_size)
         self.player_hand_size = new_hand_size
 
     # update model's hand
     def update_model_hand(self, new_hand):
-        print("update_model_hand", new_hand)
+        log.debug("update_model_hand %s", new_hand)
         self.hand = new_hand
         # model "sees" change in game-state
         self.set_hand(self.get_lowest_card())
@@ -513,40 +536,42 @@ class Model(CognitiveModel):
 
     # Client indicated round has ended, save learned memory for this round
     def end_round(self, round):
-        print("Round has ended, save learned memory here", round)
+        log.debug("Round has ended, save learned memory here %s", round)
+        self.append_learned_memory()
+
+    # the session with the player ended, stop playing and save what was learned
+    def close(self):
+        log.debug("close")
+        self.reset_timers()
         self.append_learned_memory()
 
     def new_game(self):
-        print("new_game")
+        log.debug("new_game")
         self.reset_game()
 
     def new_round(self, new_hand):
-        print("new_round")
+        log.debug("new_round")
         self.reset_timers()
         self.reset_round()
         self.update_player_hand_size(len(new_hand))
         self.update_model_hand(new_hand)
 
     def reset_timers(self):
-        print("reset_timers")
-        if self.timer is not None:
-            self.timer.cancel()
-            self.timer = None
-        if self.check_in is not None:
-            self.check_in.cancel()
-            self.check_in = None
-        if self.discard_timer is not None:
-            self.discard_timer.cancel()
-            self.discard_timer = None
+        log.debug("reset_timers")
+        # a paused timer is not scheduled, so it is kept
+        self.scheduler.cancel_all()
+        self.timer = None
+        self.check_in = None
+        self.discard_timer = None
 
     def reset_game(self):
-        print("reset_game")
+        log.debug("reset_game")
         self.shurikens_left = 1
         self.lives_left = 2
         self.reset_round()
 
     def reset_round(self):
-        print("reset_round")
+        log.debug("reset_round")
         self.deck_top_card = 0
         self.player_hand_size = 0
         self.hand = []
@@ -0,0 +1,218 @@
+# Saving of learned memories. What the models learned is kept compacted: one row per wait fact (gap, pulses) with
+# the number of times it was learned and when it was last learned, instead of a row for every time it was learned.
+# The server saves write-behind: models queue their new rows, and a background task merges them into the store
+# in batches, so saving never makes a game event wait for the disk.
+import argparse
+import asyncio
+import csv
+import logging
+import os
+
+log = logging.getLogger('mind.memory')
+
+store_path = '../data/learned_facts.csv'
+# log with a row of [gap, seconds, pulses] for every time a fact was learned, replaced by the compacted store.
+# Once its rows are in the store, the log is renamed with migrated_suffix so they are never added twice
+legacy_path = '../data/learned_memory.csv'
+migrated_suffix = '.migrated'
+
+columns = ['Gap', 'Pulses', 'Count', 'Last seen']
+
+
+def _number(text):
+    return int(float(text))
+
+
+# read the compacted store as (gap, pulses) -> [count, time last seen or None], in order of first appearance
+def read_learned_facts(path=store_path):
+    facts = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            last_seen = row['Last seen']
+            facts[_number(row['Gap']), _number(row['Pulses'])] = [int(row['Count']),
+                                                                   float(last_seen) if last_seen else None]
+    return facts
+
+
+# read a learned memory log as compacted facts. When the facts were learned was not logged
+def read_legacy_learned_memory(path=legacy_path):
+    with open(path, newline='') as f:
+        return merge_learned_facts({}, ((row['Gap'], row['Pulses'], None) for row in csv.DictReader(f)))
+
+
+# the learned facts saved so far: the compacted store, or the legacy log as long as it has not been compacted
+def load_learned_facts(path=store_path, legacy=legacy_path):
+    if os.path.isfile(path):
+        return read_learned_facts(path)
+    if legacy is not None and os.path.isfile(legacy):
+        return read_legacy_learned_memory(legacy)
+    return {}
+
+
+# count rows of [gap, pulses, time seen] into facts
+def merge_learned_facts(facts, rows):
+    for gap, pulses, seen in rows:
+        key = _number(gap), _number(pulses)
+        fact = facts.get(key)
+        if fact is None:
+            facts[key] = [1, seen]
+            continue
+        fact[0] += 1
+        if seen is not None and (fact[1] is None or seen > fact[1]):
+            fact[1] = seen
+    return facts
+
+
+# replace the store with facts, through a temporary file so a crash never leaves a partly written store
+def write_learned_facts(facts, path=store_path):
+    temporary = path + '.tmp'
+    with open(temporary, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(columns)
+        writer.writerows([gap, pulses, count, '' if last_seen is None else '%.3f' % last_seen]
+                         for (gap, pulses), (count, last_seen) in facts.items())
+    os.replace(temporary, path)
+
+
+# whether the facts of load_learned_facts come from the legacy log, which is then migrated by saving them
+def _migrating(path, legacy):
+    return not os.path.isfile(path) and legacy is not None and os.path.isfile(legacy)
+
+
+# rename a legacy log whose rows are in the store
+def mark_migrated(legacy):
+    os.replace(legacy, legacy + migrated_suffix)
+    log.info("Moved %s to %s, its rows are in the store of learned facts", legacy, legacy + migrated_suffix)
+
+
+def was_migrated(legacy):
+    return legacy.endswith(migrated_suffix) or os.path.exists(legacy + migrated_suffix)
+
+
+# modification time and size of a file, None if it does not exist
+def _modified(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+# save rows of [gap, pulses, time seen] right away
+def write_learned_memory(rows, path=store_path, legacy=legacy_path):
+    migrating = _migrating(path, legacy)
+    write_learned_facts(merge_learned_facts(load_learned_facts(path, legacy), rows), path)
+    if migrating:
+        mark_migrated(legacy)
+
+
+# add the rows of a learned memory log to the store and mark the log as migrated,
+# returns the number of rows and of facts in the store
+def compact_learned_memory(source=legacy_path, path=store_path):
+    if was_migrated(source):
+        raise ValueError("%s was already migrated into the store of learned facts" % source)
+    facts = read_learned_facts(path) if os.path.isfile(path) else {}
+    logged = read_legacy_learned_memory(source)
+    for key, (count, _) in logged.items():
+        facts.setdefault(key, [0, None])[0] += count
+    write_learned_facts(facts, path)
+    mark_migrated(source)
+    return sum(count for count, _ in logged.values()), len(facts)
+
+
+class LearnedMemoryWriter:
+    """
+    Queues rows of [gap, pulses, time seen] and merges them into the store of learned facts from a background task.
+    A batch is saved once max_rows rows are queued or max_delay seconds have passed, and whatever is left when the
+    writer is closed. The facts are kept in memory and only read again when the store was changed by something else,
+    and the store is written in a thread, off the event loop. As long as there is no store, it starts from the legacy
+    log, which is marked as migrated once its rows are saved in the store.
+    """
+
+    def __init__(self, path=store_path, legacy=legacy_path, max_rows=100, max_delay=5.0):
+        self.path = path
+        self.legacy = legacy
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._pending = []  # rows that are not saved yet
+        self._facts = None  # the saved facts, read when the first batch is saved
+        self._modified = None  # modification time and size of the store when it was last read or written
+        self._wake = None  # set to save the pending rows right away
+        self._task = None
+        self._closing = False
+
+    # queue rows to be saved, can be used as CognitiveModel.memory_writer
+    def append(self, rows):
+        self._pending.extend(rows)
+        if len(self._pending) >= self.max_rows and self._wake is not None:
+            self._wake.set()
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.max_delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Failed to save learned memories")
+
+    # save all pending rows. Rows that could not be saved, e.g. because the store cannot be read, stay pending
+    async def flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, rows)
+        except Exception:
+            log.exception("Failed to save %s learned memories, trying again later", len(rows))
+            self._pending[:0] = rows
+
+    def _write(self, rows):
+        migrating = False
+        modified = _modified(self.path)
+        if self._facts is None or modified != self._modified:
+            migrating = _migrating(self.path, self.legacy)
+            self._facts = load_learned_facts(self.path, self.legacy)
+            self._modified = modified
+        # merge into a copy, so a failed write leaves the facts as they are in the store
+        facts = merge_learned_facts({key: list(fact) for key, fact in self._facts.items()}, rows)
+        write_learned_facts(facts, self.path)
+        self._facts = facts
+        self._modified = _modified(self.path)
+        if migrating:
+            mark_migrated(self.legacy)
+        log.debug("Saved %s learned memories", len(rows))
+
+    # save what is still pending and stop the background task
+    async def close(self):
+        self._closing = True
+        if self._task is not None:
+            self._wake.set()
+            try:
+                await self._task
+            except Exception:
+                log.exception("Saving learned memories stopped")
+        await self.flush()
+        if self._pending:
+            log.error("Lost %s learned memories that could not be saved", len(self._pending))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compact a learned memory log into the store of learned facts")
+    parser.add_argument('command', choices=['compact'])
+    parser.add_argument('--source', default=legacy_path, help="learned memory log to compact")
+    parser.add_argument('--store', default=store_path, help="store of learned facts to add the log to")
+    args = parser.parse_args()
+    try:
+        row_count, fact_count = compact_learned_memory(args.source, args.store)
+    except ValueError as error:
+        parser.exit(1, f"{error}, not compacting it again.\n")
+    print(f"Compacted {row_count} rows of {args.source} into {args.store}, which now holds {fact_count} facts.")
+    print(f"{args.source} was moved to {args.source}{migrated_suffix}.")
@@ -0,0 +1,62 @@
+import asyncio
+import time as tm
+from collections import OrderedDict
+
+
+class SessionRegistry:
+    """
+    Keeps one model per connected client, keyed by its sid. Sessions that have been idle for longer than ttl
+    seconds are evicted, and so is the least recently used session when there are more than max_sessions.
+    Evicted models are closed, so their timers stop and what they learned is saved.
+    """
+
+    def __init__(self, factory, ttl=30 * 60, max_sessions=500):
+        self._factory = factory  # creates the model of a new session, given its sid
+        self._sessions = OrderedDict()  # sid -> (model, time of last use), least recently used first
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+
+    # return the model of a session, creating it if the session is new
+    def get(self, sid):
+        if sid in self._sessions:
+            model, _ = self._sessions.pop(sid)
+        else:
+            model = self._factory(sid)
+        self._sessions[sid] = model, tm.monotonic()
+        while len(self._sessions) > self.max_sessions:
+            self._evict(next(iter(self._sessions)))
+        return model
+
+    # end a session, e.g. when its client disconnects
+    def remove(self, sid):
+        if sid in self._sessions:
+            self._evict(sid)
+
+    # end all sessions that have been idle for longer than the ttl
+    def evict_idle(self):
+        now = tm.monotonic()
+        idle = [sid for sid, (_, last_used) in self._sessions.items() if now - last_used > self.ttl]
+        for sid in idle:
+            self._evict(sid)
+        return len(idle)
+
+    # end all sessions, e.g. when the server shuts down
+    def clear(self):
+        for sid in list(self._sessions):
+            self._evict(sid)
+
+    # check for idle sessions every interval seconds, run as a background task
+    async def evict_periodically(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    def _evict(self, sid):
+        model, _ = self._sessions.pop(sid)
+        model.close()
+
+    def __contains__(self, sid):
+        return sid in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,318 @@
+# Headless simulator: plays full games of The Mind between the model and a synthetic player on a virtual clock,
+# so thousands of games can be played without the web client and without waiting in real time
+import argparse
+import heapq
+import itertools
+import json
+import time as tm
+import traceback
+import numpy as np
+import handlers
+import logs
+from model import Model
+from timer import Scheduler
+
+
+class VirtualClock:
+    """
+    Discrete-event clock: callbacks are scheduled at a virtual time and run in order of that time,
+    jumping the clock forward instead of waiting. It has the methods of an event loop that a Scheduler uses.
+    """
+
+    def __init__(self):
+        self._time = 0.0
+        self._events = []  # heap of (time, sequence number, event)
+        self._sequence = itertools.count()
+
+    def time(self):
+        return self._time
+
+    def call_later(self, delay, callback, *args):
+        event = VirtualEvent(self._time + delay, callback, args)
+        heapq.heappush(self._events, (event.when, next(self._sequence), event))
+        return event
+
+    # run the scheduled callbacks in order until there are none left, stop() is called or the clock reaches until
+    def run(self, until=float('inf')):
+        self._stopped = False
+        while self._events and not self._stopped:
+            when, _, event = heapq.heappop(self._events)
+            if when > until:
+                heapq.heappush(self._events, (when, next(self._sequence), event))
+                break
+            if event.cancelled:
+                continue
+            self._time = when
+            run_to_end(event.callback(*event.args))
+
+    def stop(self):
+        self._stopped = True
+
+    def create_task(self, coroutine):
+        run_to_end(coroutine)
+
+
+class VirtualEvent:
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+# run a callback's coroutine to its end. Simulated callbacks never really wait, so it finishes in one step
+def run_to_end(result):
+    if hasattr(result, 'send'):
+        try:
+            result.send(None)
+        except StopIteration:
+            return
+        raise RuntimeError("A simulated callback tried to wait for something outside the virtual clock")
+
+
+class SimulatedModel(Model):
+    # simulated games should not change the learned memory data file
+    memory_writer = staticmethod(lambda rows: None)
+
+    def __init__(self, game, seed=None):
+        self.clock = game.clock
+        super().__init__(sio=game, sid='simulated', seed=seed, scheduler=Scheduler(game.clock))
+
+    def now(self):
+        return self.clock.time()
+
+
+class SyntheticPlayer:
+    """
+    Stochastic stand-in for the human player. It waits longer before playing its lowest card the larger the gap
+    with the top card, proposes a shuriken now and then when it would have to wait long, and accepts the model's
+    shuriken proposals at random.
+    """
+
+    def __init__(self, rng, base_wait=0.5, wait_per_gap=0.25, wait_noise=0.3, propose_after=15.0,
+                 propose_probability=0.3, accept_probability=0.5):
+        self.rng = rng
+        self.base_wait = base_wait  # seconds before playing a card right above the top card
+        self.wait_per_gap = wait_per_gap  # extra seconds for each number between the top card and the card
+        self.wait_noise = wait_noise  # sd of the log-normal noise on wait times
+        self.propose_after = propose_after  # wait times from which the player considers proposing a shuriken
+        self.propose_probability = propose_probability
+        self.accept_probability = accept_probability
+
+    def get_wait_time(self, gap):
+        return (self.base_wait + self.wait_per_gap * gap) * self.rng.lognormal(0, self.wait_noise)
+
+    def proposes_shuriken(self, wait_time):
+        return wait_time >= self.propose_after and self.rng.random() < self.propose_probability
+
+    def accepts_shuriken(self):
+        return self.rng.random() < self.accept_probability
+
+
+class Game:
+    """
+    One game of The Mind between a simulated model and a synthetic player. Plays the role of the web client:
+    it deals the cards, keeps track of the true game state and sends the model the same events the client would.
+    """
+
+    # levels that reward a shuriken or a life when completed, as in the card game for two players
+    shuriken_rewards = (2, 5, 8)
+    life_rewards = (3, 6, 9)
+    reaction_time = 0.05  # seconds before the client passes something on to the model
+    max_time = 3600  # virtual seconds after which a game is stopped
+
+    def __init__(self, player, seed=None, max_level=12):
+        self.clock = VirtualClock()
+        self.player = player
+        self.rng = np.random.default_rng(seed)
+        self.max_level = max_level
+        self.level = 0
+        self.lives = 2
+        self.shurikens = 1
+        self.top_card = 0
+        self.player_hand = []
+        self.model_hand = []
+        self.player_move = None  # scheduled play or shuriken proposal of the player
+        self.player_deadline = None  # when the player will play their lowest card
+        self.stats = {'levels': 0, 'lives_lost': 0, 'early': 0, 'late': 0, 'shurikens_used': 0,
+                      'model_proposals': 0, 'player_proposals': 0, 'model_plays': 0, 'timing_errors': []}
+        self.model = SimulatedModel(self, seed=None if seed is None else seed + 1)
+
+    # play the game until the lives run out or the last level is completed
+    def play(self):
+        handlers.new_game(self.model)
+        self.start_round(1)
+        self.clock.run(until=self.max_time)
+        self.stats['levels'] = self.level - 1 if self.lives <= 0 or self.level > self.max_level else self.level
+        return self.stats
+
+    def start_round(self, level):
+        self.level = level
+        if level > self.max_level:
+            self.clock.stop()
+            return
+        cards = self.rng.choice(np.arange(1, 101), size=2 * level, replace=False).tolist()
+        self.player_hand = sorted(cards[:level])
+        self.model_hand = sorted(cards[level:])
+        self.top_card = 0
+        handlers.new_round(self.model, list(self.model_hand))
+        self.schedule_player()
+
+    # the player (re)decides when to play their lowest card, whenever the top card changes
+    def schedule_player(self):
+        if self.player_move is not None:
+            self.player_move.cancel()
+            self.player_move = None
+        self.player_deadline = None
+        if not self.player_hand:
+            return
+        wait = self.player.get_wait_time(self.player_hand[0] - self.top_card)
+        if self.shurikens > 0 and self.player.proposes_shuriken(wait):
+            self.player_move = self.clock.call_later(self.reaction_time, self.player_proposes_shuriken)
+        else:
+            self.player_move = self.clock.call_later(wait, self.player_plays, self.player_hand[0])
+            self.player_deadline = self.player_move.when
+
+    def player_plays(self, card):
+        self.player_move = None
+        self.player_hand.remove(card)
+        lower = [c for c in self.model_hand if c < card]
+        if lower:
+            # the model waited too long; it finds out and discards its lower cards by itself
+            self.lose_life('late')
+            timer = self.model.timer
+            if timer is not None and timer.when is not None:
+                self.stats['timing_errors'].append(timer.when - self.clock.time())
+        self.top_card = max(self.top_card, card)
+        handlers.card_played(self.model, card)
+        self.after_move()
+
+    async def player_proposes_shuriken(self):
+        self.player_move = None
+        self.stats['player_proposals'] += 1
+        await handlers.shuriken_proposed(self.model)
+
+    # events the model sends to the client
+    async def emit(self, event, data=None, to=None):
+        if event == 'play_card':
+            self.model_plays(data)
+        elif event in ('discard_card', 'shuriken_discard_card'):
+            if data in self.model_hand:
+                self.model_hand.remove(data)
+            self.after_move()
+        elif event == 'propose_shuriken':
+            self.stats['model_proposals'] += 1
+            vote = 'yes' if self.player.accepts_shuriken() else 'no'
+            self.clock.call_later(self.reaction_time, self.vote_on_shuriken, vote)
+        elif event == 'shuriken_vote':
+            if data == 'true':
+                self.clock.call_later(self.reaction_time, self.use_shuriken)
+            else:
+                self.schedule_player()
+
+    def model_plays(self, card):
+        self.stats['model_plays'] += 1
+        self.model_hand.remove(card)
+        lower = [c for c in self.player_hand if c < card]
+        if lower:
+            # the model played too early, the player discards their lower cards
+            self.lose_life('early')
+            if self.player_deadline is not None:
+                self.stats['timing_errors'].append(self.player_deadline - self.clock.time())
+            for c in lower:
+                self.player_hand.remove(c)
+                self.clock.call_later(self.reaction_time, handlers.discard_card, self.model)
+        self.top_card = max(self.top_card, card)
+        self.schedule_player()
+        self.after_move()
+
+    def vote_on_shuriken(self, vote):
+        handlers.shuriken_vote(self.model, vote)
+        if vote == 'yes':
+            self.use_shuriken()
+
+    # both players discard their lowest card, the model learns the player's lowest card
+    def use_shuriken(self):
+        self.shurikens -= 1
+        self.stats['shurikens_used'] += 1
+        if self.player_hand:
+            lowest = self.player_hand.pop(0)
+            self.top_card = max(self.top_card, lowest)
+            handlers.reveal_lowest_card(self.model, lowest)
+            handlers.update_player_hand_size(self.model, len(self.player_hand))
+        self.schedule_player()
+        self.after_move()
+
+    def lose_life(self, kind):
+        self.lives -= 1
+        self.stats['lives_lost'] += 1
+        self.stats[kind] += 1
+        if self.lives <= 0:
+            self.clock.stop()
+
+    # start the next round once both hands are empty
+    def after_move(self):
+        if self.lives <= 0 or self.player_hand or self.model_hand:
+            return
+        if self.player_move is not None:
+            self.player_move.cancel()
+            self.player_move = None
+        level = self.level
+        handlers.end_round(self.model, level)
+        if level in self.shuriken_rewards:
+            self.shurikens += 1
+            handlers.get_shuriken(self.model, 1)
+        if level in self.life_rewards:
+            self.lives += 1
+            handlers.get_life(self.model, 1)
+        self.clock.call_later(self.reaction_time, self.start_round, level + 1)
+
+
+# play a number of games and summarise them
+def simulate(games, seed=0, **player_args):
+    rng = np.random.default_rng(seed)
+    results = []
+    failed = 0
+    start = tm.perf_counter()
+    for i in range(games):
+        game = Game(SyntheticPlayer(rng, **player_args), seed=seed + 2 * i)
+        try:
+            results.append(game.play())
+        except Exception:
+            traceback.print_exc()
+            failed += 1
+    wall_time = tm.perf_counter() - start
+
+    errors = np.array([e for r in results for e in r['timing_errors']])
+    summary = {
+        'games': games,
+        'failed_games': failed,
+        'wall_time': wall_time,
+        'games_per_minute': 60 * games / wall_time if wall_time else None,
+        'mean_level': float(np.mean([r['levels'] for r in results])) if results else None,
+        'max_level': max((r['levels'] for r in results), default=None),
+        'lives_lost': sum(r['lives_lost'] for r in results),
+        'lives_lost_model_early': sum(r['early'] for r in results),
+        'lives_lost_model_late': sum(r['late'] for r in results),
+        'shurikens_used': sum(r['shurikens_used'] for r in results),
+        'shurikens_proposed_by_model': sum(r['model_proposals'] for r in results),
+        'shurikens_proposed_by_player': sum(r['player_proposals'] for r in results),
+        'model_plays': sum(r['model_plays'] for r in results),
+        'timing_error_mean': float(errors.mean()) if len(errors) else None,
+        'timing_error_median': float(np.median(errors)) if len(errors) else None,
+        'timing_error_p90': float(np.percentile(errors, 90)) if len(errors) else None,
+    }
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play The Mind between the model and a synthetic player")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="show the model's narration")
+    args = parser.parse_args()
+    logs.configure('DEBUG' if args.verbose else 'WARNING')
+    print(json.dumps(simulate(args.games, args.seed), indent=2))
@@ -0,0 +1,144 @@
+# Snapshots of a fully built declarative memory, so a process can load the memory built from the data files
+# instead of replaying every row of them. A snapshot is an uncompressed npz file of arrays:
+#   names                  chunk names, in order of insertion
+#   slot_names             slots in the order they first appear in chunks
+#   slot_kinds             per slot and chunk whether the chunk has that slot, and the type of its value (see kinds)
+#   slot_numbers           per slot and chunk the numeric value, nan for other kinds
+#   slot_texts             per slot and chunk the string value as index into strings, -1 for other kinds
+#   strings                all string slot values
+#   encounters             encounter times of all chunks one after the other, starting at encounter_offsets
+#   encounter_count, first_encounter (nan for none), fan, blc
+#   format, key            format version, and the key of the sources the memory was built from
+# A snapshot whose format or key differs from what the loader expects is stale and is rebuilt.
+import hashlib
+import logging
+import os
+import zipfile
+import numpy as np
+from chunkCog import Chunk
+from memory import DeclarativeMemory
+
+log = logging.getLogger('mind.memory')
+
+# bump whenever the layout of the file changes
+format_version = 1
+
+kinds = {None: 0, int: 1, float: 2, str: 3}
+
+
+def source_key(paths, *parameters):
+    """
+    Key of the memory built from the files at paths with the given parameters:
+    a hash of the parameters and of the contents of the files, and of which of them exist
+    """
+    digest = hashlib.sha256(repr(parameters).encode())
+    for path in paths:
+        digest.update(path.encode() + b'\0')
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        else:
+            digest.update(b'missing')
+    return digest.hexdigest()
+
+
+def _kind(value):
+    if isinstance(value, str):
+        return str
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return int
+    if isinstance(value, (float, np.floating)):
+        return float
+    raise TypeError("Cannot store slot value %r in a snapshot" % (value,))
+
+
+def save(dm, path, key):
+    """
+    Write the chunks of dm to a snapshot at path. The file is replaced at once, so processes that load it
+    at the same time never see a partly written snapshot.
+    """
+    chunks = list(dm)
+    slot_names = list(dict.fromkeys(slot for chunk in chunks for slot in chunk.slots))
+    strings = {}
+    slot_kinds = np.zeros((len(slot_names), len(chunks)), dtype=np.int8)
+    slot_numbers = np.full((len(slot_names), len(chunks)), np.nan)
+    slot_texts = np.full((len(slot_names), len(chunks)), -1, dtype=np.int32)
+    for column, slot in enumerate(slot_names):
+        for row, chunk in enumerate(chunks):
+            if slot not in chunk.slots:
+                continue
+            value = chunk.slots[slot]
+            value_kind = _kind(value)
+            slot_kinds[column, row] = kinds[value_kind]
+            if value_kind is str:
+                slot_texts[column, row] = strings.setdefault(value, len(strings))
+            else:
+                slot_numbers[column, row] = value
+
+    first_encounter = [np.nan if chunk.first_encounter is None else chunk.first_encounter for chunk in chunks]
+    # a temporary file of this process, so processes that save at the same time do not write to the same file
+    temporary = '%s.%s.tmp' % (path, os.getpid())
+    with open(temporary, 'wb') as f:
+        np.savez(f, format=format_version, key=key,
+                 names=np.array([chunk.name for chunk in chunks], dtype=str),
+                 slot_names=np.array(slot_names, dtype=str),
+                 slot_kinds=slot_kinds, slot_numbers=slot_numbers, slot_texts=slot_texts,
+                 strings=np.array(list(strings), dtype=str),
+                 encounters=np.array([t for chunk in chunks for t in chunk.encounters], dtype=float),
+                 encounter_offsets=np.cumsum([0] + [len(chunk.encounters) for chunk in chunks]),
+                 encounter_count=np.array([chunk.encounter_count for chunk in chunks], dtype=np.int64),
+                 first_encounter=np.array(first_encounter, dtype=float),
+                 fan=np.array([chunk.fan for chunk in chunks], dtype=np.int64),
+                 blc=np.array([chunk.blc for chunk in chunks], dtype=float))
+    os.replace(temporary, path)
+
+
+def load(path, key):
+    """
+    Read a DeclarativeMemory from the snapshot at path, or return None if there is no snapshot
+    or it was not built from the sources with this key
+    """
+    if not os.path.isfile(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if int(data['format']) != format_version or str(data['key']) != key:
+                log.info("Snapshot %s is out of date", path)
+                return None
+            dm = _memory(data)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as error:
+        log.warning("Cannot read snapshot %s: %s", path, error)
+        return None
+    log.info("Loaded %s chunks from snapshot %s", len(dm), path)
+    return dm
+
+
+def _memory(data):
+    names = data['names'].tolist()
+    strings = data['strings'].tolist()
+    slots = [{} for _ in names]
+    for slot, kind, number, text in zip(data['slot_names'].tolist(), data['slot_kinds'].tolist(),
+                                        data['slot_numbers'].tolist(), data['slot_texts'].tolist()):
+        for row, value_kind in enumerate(kind):
+            if value_kind == kinds[int]:
+                slots[row][slot] = int(number[row])
+            elif value_kind == kinds[float]:
+                slots[row][slot] = number[row]
+            elif value_kind == kinds[str]:
+                slots[row][slot] = strings[text[row]]
+
+    encounters = data['encounters']
+    offsets = data['encounter_offsets'].tolist()
+    encounter_count = data['encounter_count'].tolist()
+    first_encounter = data['first_encounter'].tolist()
+    fan = data['fan'].tolist()
+    blc = data['blc'].tolist()
+    dm = DeclarativeMemory()
+    for row, name in enumerate(names):
+        chunk = Chunk(name, slots[row], blc[row])
+        chunk.encounters.frombytes(encounters[offsets[row]:offsets[row + 1]].tobytes())
+        chunk.encounter_count = encounter_count[row]
+        chunk.first_encounter = None if np.isnan(first_encounter[row]) else first_encounter[row]
+        chunk.fan = fan[row]
+        dm.add(chunk)
+    return dm
@@ -1,35 +1,202 @@
 # Temporal module on the basis of the pace-maker accumulator model
-import random
+# Pulse n + 1 lasts a * duration of pulse n plus logistic noise with an sd proportional to that duration,
+# so the duration of pulse n is t_0 times a product of n noisy factors a * (1 + b * logistic noise).
+# Without noise the durations form a geometric series, which has a closed form.
+#
+# Conversions look up precomputed tables: the noise-free time at which each pulse ends, and Monte-Carlo quantiles
+# of the time a run of n pulses takes. Drawing a quantile level and looking up the quantile samples the time of a
+# run; counting the pulses whose quantile at that level has passed samples the pulses in a time. Runs longer than
+# the tables are simulated.
+from bisect import bisect_right
+from functools import lru_cache
+import numpy as np
 import math
 
+# Noise source for callers that do not pass their own generator
+default_rng = np.random.default_rng()
+
+table_pulses = 128  # longest run in the lookup tables, in pulses
+table_levels = 257  # quantile levels per run length, evenly spaced from 0 to 1
+table_runs = 10000  # simulated runs the quantiles are estimated from
+
 
 # Generates logistic noise with M = 0, SD = s
-def noise(s):
-    rand = random.uniform(0.001, 0.999)
+def noise(s, rng=None):
+    rand = (default_rng if rng is None else rng).uniform(0.001, 0.999)
     return s * math.log((1 - rand) / rand)
 
 
-# Takes time in seconds and returns pulses
-def time_to_pulses(time, t_0=0.011, a=1.1, b=0.015, add_noise=True):
-    pulses = 0
-    pulse_duration = t_0
+# Generates an array of logistic noise with M = 0, SD = 1, the same distribution as noise() draws from
+def logistic_noise(size, rng=None):
+    rand = (default_rng if rng is None else rng).uniform(0.001, 0.999, size)
+    return np.log((1 - rand) / rand)
+
+
+# Durations of the first pulses of one or more pacemaker runs: shape is (count,) or (runs, count)
+def pulse_durations(count, t_0=0.011, a=1.1, b=0.015, add_noise=True, rng=None, runs=None):
+    shape = (count,) if runs is None else (runs, count)
+    if not add_noise:
+        return np.broadcast_to(t_0 * a ** np.arange(count, dtype=float), shape)
+    if count == 0:
+        return np.empty(shape)
+    # each pulse is a noisy factor longer than the one before it
+    factors = np.empty(shape)
+    factors[..., 0] = t_0
+    factors[..., 1:] = a * (1 + b * logistic_noise(shape[:-1] + (count - 1,), rng))
+    return np.cumprod(factors, axis=-1)
+
+
+@lru_cache(maxsize=8)
+def lookup_tables(t_0=0.011, a=1.1, b=0.015):
+    """
+    Return the lookup tables of a pacemaker, computed once per set of parameters:
+    a list of the noise-free times at which pulses 0 to table_pulses end, and an array with, for each quantile level,
+    the quantiles of the times that runs of 0 to table_pulses pulses take.
+    The simulated runs have their own seeded generator, so the tables are the same in every process.
+    """
+    ends = _noise_free_time(np.arange(table_pulses + 1), t_0, a).tolist()
+    runs = np.cumsum(pulse_durations(table_pulses, t_0, a, b, rng=np.random.default_rng(0), runs=table_runs), axis=1)
+    # sorted times of the runs per length; the quantiles interpolate between them
+    times = np.sort(runs.T, axis=1)
+    positions = np.linspace(0, table_runs - 1, table_levels)
+    below = np.minimum(positions.astype(int), table_runs - 2)
+    fraction = positions - below
+    quantiles = np.zeros((table_levels, table_pulses + 1))
+    quantiles[:, 1:] = (times[:, below] + fraction * (times[:, below + 1] - times[:, below])).T
+    return ends, quantiles
+
 
-    while time >= pulse_duration:
-        time = time - pulse_duration
-        pulses = pulses + 1
-        pulse_duration = a * pulse_duration + add_noise * noise(b * a * pulse_duration)
+# number of whole pulses in a number of pulses, the model waits for a fraction of a pulse as for a whole pulse
+def _pulse_count(pulses):
+    return np.maximum(0, np.ceil(pulses)).astype(int)
 
+
+# Expected number of pulses in time seconds without noise, solving t_0 * (a^n - 1) / (a - 1) <= time for n
+def _noise_free_pulses(time, t_0, a):
+    time = np.maximum(time, 0)
+    if a == 1:
+        return np.floor(time / t_0).astype(int)
+    pulses = np.floor(np.log1p(time * (a - 1) / t_0) / math.log(a)).astype(int)
+    # correct rounding errors at the boundaries of pulses
+    pulses -= _noise_free_time(pulses, t_0, a) > time
+    pulses += _noise_free_time(pulses + 1, t_0, a) <= time
     return pulses
 
 
+def _noise_free_time(pulses, t_0, a):
+    if a == 1:
+        return t_0 * pulses
+    return t_0 * np.expm1(pulses * math.log(a)) / (a - 1)
+
+
+# number of pulses to draw for a run of time seconds: likely more than the run counts
+def _run_length(time, t_0, a):
+    time = max(time, 0)
+    expected = time / t_0 if a == 1 else math.log1p(time * (a - 1) / t_0) / math.log(a)
+    return int(expected * 1.25) + 8
+
+
+# draw random quantile levels, as the index of the level in the tables below them and the fraction towards the next
+def _levels(rng, size=None):
+    levels = (default_rng if rng is None else rng).random(size) * (table_levels - 1)
+    below = np.minimum(np.floor(levels).astype(int), table_levels - 2)
+    return below, levels - below
+
+
+# Takes time in seconds and returns pulses
+def time_to_pulses(time, t_0=0.011, a=1.1, b=0.015, add_noise=True, rng=None):
+    ends, quantiles = lookup_tables(t_0, a, b)
+    if not add_noise:
+        pulses = max(0, bisect_right(ends, time) - 1)
+        return pulses if pulses < table_pulses else int(_noise_free_pulses(np.float64(time), t_0, a))
+    below, fraction = _levels(rng)
+    # the times runs of each length take at the drawn quantile level, which grow with the length of the run
+    times = quantiles[below] + fraction * (quantiles[below + 1] - quantiles[below])
+    pulses = max(0, int(np.searchsorted(times, time, side='right')) - 1)
+    return pulses if pulses < table_pulses else _simulate_time_to_pulses(time, t_0, a, b, rng)
+
+
 # Takes pulses and returns time in seconds
-def pulses_to_time(pulses, t_0=0.011, a=1.1, b=0.015, add_noise=True):
-    time = 0
-    pulse_duration = t_0
+def pulses_to_time(pulses, t_0=0.011, a=1.1, b=0.015, add_noise=True, rng=None):
+    count = int(_pulse_count(pulses))
+    if count > table_pulses:
+        return _simulate_pulses_to_time(count, t_0, a, b, add_noise, rng)
+    ends, quantiles = lookup_tables(t_0, a, b)
+    if not add_noise:
+        return ends[count]
+    below, fraction = _levels(rng)
+    low = quantiles[below, count]
+    return float(low + fraction * (quantiles[below + 1, count] - low))
+
+
+# Takes an array of times in seconds and returns the pulses counted in each of them, in independent runs
+def time_to_pulses_batch(times, t_0=0.011, a=1.1, b=0.015, add_noise=True, rng=None):
+    times = np.asarray(times, dtype=float)
+    if not add_noise:
+        return _noise_free_pulses(times, t_0, a)
+    _, quantiles = lookup_tables(t_0, a, b)
+    below, fraction = _levels(rng, times.size)
+    run_times = quantiles[below] + fraction[:, None] * (quantiles[below + 1] - quantiles[below])
+    pulses = (run_times <= times.reshape(-1, 1)).sum(axis=1) - 1
+    pulses = np.maximum(0, pulses).reshape(times.shape)
+    longer = pulses >= table_pulses
+    if longer.any():
+        pulses[longer] = _simulate_time_to_pulses_batch(times[longer], t_0, a, b, rng)
+    return pulses
+
+
+# Takes an array of pulses and returns the time each of them takes, in independent runs
+def pulses_to_time_batch(pulses, t_0=0.011, a=1.1, b=0.015, add_noise=True, rng=None):
+    counts = _pulse_count(np.asarray(pulses, dtype=float))
+    if not add_noise:
+        return _noise_free_time(counts, t_0, a)
+    _, quantiles = lookup_tables(t_0, a, b)
+    below, fraction = _levels(rng, counts.shape)
+    within = np.minimum(counts, table_pulses)
+    low = quantiles[below, within]
+    times = low + fraction * (quantiles[below + 1, within] - low)
+    longer = counts > table_pulses
+    if longer.any():
+        times[longer] = _simulate_pulses_to_time_batch(counts[longer], t_0, a, b, rng)
+    return times
+
+
+# The conversions by simulating pacemaker runs, for runs longer than the lookup tables
+
+def _simulate_time_to_pulses(time, t_0, a, b, rng):
+    # draw a run somewhat longer than expected, and a longer one in the rare case it turns out too short
+    count = _run_length(time, t_0, a)
+    while True:
+        ends = np.cumsum(pulse_durations(count, t_0, a, b, True, rng))
+        # a pulse is counted once it has fully passed
+        pulses = int(np.searchsorted(ends, time, side='right'))
+        if pulses < count:
+            return pulses
+        count *= 2
+
+
+def _simulate_pulses_to_time(count, t_0, a, b, add_noise, rng):
+    return float(pulse_durations(count, t_0, a, b, add_noise, rng).sum())
+
+
+def _simulate_time_to_pulses_batch(times, t_0, a, b, rng):
+    pulses = np.empty(times.shape, dtype=int)
+    pending = np.arange(times.size)
+    flat_times = times.ravel()
+    count = _run_length(float(times.max(initial=0)), t_0, a)
+    while pending.size:
+        ends = np.cumsum(pulse_durations(count, t_0, a, b, True, rng, runs=pending.size), axis=1)
+        counted = (ends <= flat_times[pending][:, None]).sum(axis=1)
+        finished = counted < count
+        pulses.flat[pending[finished]] = counted[finished]
+        pending = pending[~finished]
+        count *= 2
+    return pulses
 
-    while pulses > 0:
-        time = time + pulse_duration
-        pulses = pulses - 1
-        pulse_duration = a * pulse_duration + add_noise * noise(b * a * pulse_duration)
 
-    return time
+def _simulate_pulses_to_time_batch(counts, t_0, a, b, rng):
+    count = int(counts.max(initial=0))
+    durations = pulse_durations(count, t_0, a, b, True, rng, runs=counts.size)
+    # only the first pulses of each run are counted
+    durations = np.where(np.arange(count) < counts.reshape(-1, 1), durations, 0)
+    return durations.sum(axis=1).reshape(counts.shape)
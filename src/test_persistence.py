@@ -0,0 +1,45 @@
+import asyncio
+from persistence import LearnedMemoryWriter, read_learned_facts, write_learned_facts
+
+
+# a corrupt row in the store keeps the writer's rows pending, and they are saved once the store is fixed
+def test_writer_keeps_rows_while_store_is_corrupt(tmp_path):
+    store = str(tmp_path / 'learned_facts.csv')
+    with open(store, 'w') as f:
+        f.write("Gap,Pulses,Count,Last seen\n25,44,abc,\n")
+
+    async def save():
+        writer = LearnedMemoryWriter(store, legacy=None, max_delay=0.01)
+        writer.start()
+        writer.append([[1, 11, 5.0]])
+        await asyncio.sleep(0.1)
+        assert writer._pending == [[1, 11, 5.0]]
+        assert not writer._task.done()
+
+        write_learned_facts({(25, 44): [2, None]}, store)
+        writer.append([[1, 11, 6.0]])
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(save())
+    assert writer._pending == []
+    assert read_learned_facts(store) == {(25, 44): [2, None], (1, 11): [2, 6.0]}
+
+
+# closing the writer saves what is still pending, even when its background task failed
+def test_close_saves_pending_rows_after_task_failed(tmp_path):
+    store = str(tmp_path / 'learned_facts.csv')
+
+    async def save():
+        writer = LearnedMemoryWriter(store, legacy=None)
+
+        async def fail():
+            raise ValueError("failed")
+
+        writer._wake = asyncio.Event()
+        writer._task = asyncio.ensure_future(fail())
+        writer.append([[3, 9, 1.0]])
+        await writer.close()
+
+    asyncio.run(save())
+    assert read_learned_facts(store) == {(3, 9): [1, 1.0]}
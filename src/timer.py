@@ -1,18 +1,128 @@
 import asyncio
+import logging
+import metrics
+
+log = logging.getLogger('mind.model')
 
 
 class Timer:
-    def __init__(self, timeout, callback):
-        self._timeout = timeout
+    """
+    Calls a callback once its time is up, unless it is cancelled first. A timer can be paused and resumed,
+    and tells how much of its time remains. Timers are created by a Scheduler, and only need the clock
+    once they are scheduled. Timers that are not resettable can only be cancelled by themselves, not by cancel_all.
+    """
+
+    def __init__(self, scheduler, delay, callback, resettable=True):
+        self._scheduler = scheduler
         self._callback = callback
-        self._task = asyncio.ensure_future(self._job())
+        self.resettable = resettable
+        self._handle = None  # handle of the scheduled call, None while paused or when done
+        self._remaining = delay  # time left while paused
+        self.when = None  # clock time at which the callback is due, None while paused or when done
+        self.done = False  # fired or cancelled
+        self.resume()
+
+    def _fire(self):
+        clock = self._scheduler.clock
+        metrics.timer_skew.observe(clock.time() - self.when, timer=getattr(self._callback, '__name__', 'callback'))
+        self._finish()
+        result = self._callback()
+        if asyncio.iscoroutine(result):
+            self._scheduler._keep(clock.create_task(result))
 
-    async def _job(self):
-        await asyncio.sleep(self._timeout)
-        await self._callback()
+    def _finish(self):
+        self._scheduler._timers.discard(self)
+        self._handle = None
+        self._remaining = 0
+        self.when = None
+        self.done = True
 
     def cancel(self):
-        self._task.cancel()
+        if self._handle is not None:
+            self._handle.cancel()
+        self._finish()
+
+    # stop the timer until it is resumed, returns the time that remained
+    def pause(self):
+        if self._handle is not None:
+            self._remaining = self.remaining()
+            self._handle.cancel()
+            self._handle = None
+            self.when = None
+            self._scheduler._timers.discard(self)
+        return self._remaining
+
+    # continue a paused timer, after an extra delay
+    def resume(self, delay=0):
+        if self.done or self._handle is not None:
+            return
+        clock = self._scheduler.clock
+        self.when = clock.time() + delay + self._remaining
+        self._handle = clock.call_later(delay + self._remaining, self._fire)
+        if self.resettable:
+            self._scheduler._timers.add(self)
+
+    def remaining(self):
+        if self.when is None:
+            return self._remaining
+        return max(0.0, self.when - self._scheduler.clock.time())
+
+    def paused(self):
+        return not self.done and self._handle is None
+
+
+_loop = None
+
+
+# loop for the timers of models used outside of an event loop, e.g. by a script. It is created once and becomes
+# the current loop, so the timers fire if the script runs it
+def _script_loop():
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+class Scheduler:
+    """
+    The timers of one model. Timers are calls scheduled on the event loop with call_later, so a waiting timer
+    costs no task. Any clock with the time, call_later and create_task methods of an event loop can be used instead.
+    """
+
+    def __init__(self, clock=None):
+        self._clock = clock  # the event loop by default, looked up when the first timer is scheduled
+        self._timers = set()  # resettable timers that are scheduled to fire
+        self._tasks = set()  # tasks of coroutines returned by callbacks, kept until they are done
+
+    @property
+    def clock(self):
+        if self._clock is None:
+            try:
+                self._clock = asyncio.get_running_loop()
+            except RuntimeError:
+                self._clock = _script_loop()
+        return self._clock
+
+    # the event loop only keeps weak references to tasks, so keep them until they are done
+    def _keep(self, task):
+        if task is None:
+            return
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Timer callback failed", exc_info=task.exception())
+
+    # call callback after delay seconds. A coroutine it returns is run as a task
+    def call_later(self, delay, callback, resettable=True):
+        return Timer(self, delay, callback, resettable)
+
+    def cancel_all(self):
+        for timer in list(self._timers):
+            timer.cancel()
 
-    def get_timeout(self):
-        return self._timeout
+    def __len__(self):
+        return len(self._timers)
@@ -0,0 +1,114 @@
+# Worker processes that each host the models of part of the players, so games can use all cores of the machine
+import asyncio
+import multiprocessing
+import signal
+import zlib
+import handlers
+import logging
+import logs
+import metrics
+from cogmodel import CognitiveModel
+from model import Model
+from sessions import SessionRegistry
+
+log = logging.getLogger('mind.server')
+
+
+class QueueEmitter:
+    """
+    Stands in for the Socket.IO server inside a worker: events emitted by models are queued for the main process,
+    which sends them to the client.
+    """
+
+    def __init__(self, outbox):
+        self._outbox = outbox
+
+    async def emit(self, event, data=None, to=None):
+        self._outbox.put(('emit', event, data, to))
+
+
+class WorkerPool:
+    """
+    Runs the models in worker processes. Every event of a player is routed to the same worker, which is picked
+    by a hash of their sid. Workers send emitted events and new learned memories back through one outbox, so only
+    the main process talks to clients and writes the learned memory data file.
+    """
+
+    def __init__(self, workers, log_settings=None):
+        self._outbox = multiprocessing.Queue()
+        self._inboxes = [multiprocessing.Queue() for _ in range(workers)]
+        self._processes = [multiprocessing.Process(target=run_worker, args=(inbox, self._outbox, index, log_settings),
+                                                   name='worker-%d' % index, daemon=True)
+                           for index, inbox in enumerate(self._inboxes)]
+        self.metrics = {}  # worker index -> last snapshot of the metrics of that worker
+
+    def start(self):
+        for process in self._processes:
+            process.start()
+
+    # stop all workers, after they closed their sessions
+    def stop(self):
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+        self._outbox.put(None)
+
+    # send an event of a player to the worker hosting their model
+    def dispatch(self, sid, event, *args):
+        self._inboxes[zlib.crc32(sid.encode()) % len(self._inboxes)].put((sid, event, args))
+
+    # forward everything the workers send to the clients or the memory writer, until the pool is stopped
+    async def relay(self, sio, memory_writer):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, self._outbox.get)
+            if message is None:
+                return
+            if message[0] == 'emit':
+                _, event, data, to = message
+                await sio.emit(event, data, to=to)
+            elif message[0] == 'memory':
+                memory_writer(message[1])
+            elif message[0] == 'metrics':
+                _, index, snapshot = message
+                self.metrics[index] = snapshot
+
+
+# entry point of a worker process
+def run_worker(inbox, outbox, index, log_settings=None):
+    # the main process stops the workers on Ctrl+C, after they saved their sessions
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # the log thread of the main process does not exist in this process
+    logs.configure(**(log_settings or {}))
+    # learned memories are written by the main process
+    CognitiveModel.memory_writer = staticmethod(lambda rows: outbox.put(('memory', rows)))
+    try:
+        asyncio.run(_serve(inbox, outbox, index))
+    finally:
+        logs.stop()
+
+
+async def _serve(inbox, outbox, index):
+    sio = QueueEmitter(outbox)
+    sessions = SessionRegistry(lambda sid: Model(sio, sid))
+    eviction = asyncio.ensure_future(sessions.evict_periodically())
+    monitor = asyncio.ensure_future(metrics.monitor_event_loop())
+    # the main process exposes the metrics of all workers
+    report = asyncio.ensure_future(metrics.report_periodically(
+        lambda snapshot: outbox.put(('metrics', index, snapshot))))
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await loop.run_in_executor(None, inbox.get)
+        if message is None:
+            break
+        sid, event, args = message
+        try:
+            await handlers.dispatch(sessions, sid, event, *args)
+        except Exception:
+            # one failing event should not take down the games of all players on this worker
+            log.exception("Failed to handle %s of %s", event, sid)
+    eviction.cancel()
+    monitor.cancel()
+    report.cancel()
+    sessions.clear()